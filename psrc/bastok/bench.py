@@ -0,0 +1,257 @@
+''' Performance benchmarks for bastok.
+
+    `synthetic_tlines()` generates a tokenized MSX-BASIC program from the
+    detokenizer's `TOKENS` table, weighted towards the things that are
+    expensive to process: strings and ``REM`` text in the high half of the
+    charset, ``DATA`` statements and numeric constants of every type.
+
+    `run_benchmarks()` times each of the `BENCHMARKS` over such a program,
+    returning the rate of each (lines, or characters of output, per
+    second). The results may be saved as a baseline with `save_results()`
+    and later results checked against it with `regressions()`; the
+    ``basbench`` command does all this from the command line.
+
+    Rates depend on the machine and Python version, so a baseline is
+    useful only on the machine where it was made; `results_info()`
+    records these so a comparison can show them.
+'''
+
+from    collections  import namedtuple
+from    timeit  import Timer
+import  json
+import  platform
+import  random
+
+from    bastok.charset.msx  import CHARMAP
+from    bastok.detok.msx2  import TOKENS, detokenize_program
+from    bastok.dump  import render_json, render_text
+from    bastok.numeric  import MAX_LINENO, encode_hex, encode_int, \
+        encode_lineno, encode_oct, encode_real
+from    bastok.tlines  import TLines, BASFile
+
+####################################################################
+#   Synthetic programs
+
+TOKBYTES = { k: t for t, k in TOKENS }
+
+#   Keywords for statements of random tokens. Those whose arguments are
+#   not tokenized (``DATA``, ``REM``, ``'``) are generated separately.
+PLAIN_TOKENS = tuple( t for t, k in TOKENS if k not in ("DATA", "REM", "'") )
+
+#   Characters for string and ``REM`` text: printable ASCII other than
+#   ``"``, the high half of the charset, and the graphic characters
+#   0x40-0x5F encoded as 0x01 followed by the code point.
+ASCII_CHARS = tuple( bytes((c,)) for c in range(0x20, 0x7F) if c != 0x22 )
+TEXT_CHARS = ASCII_CHARS + tuple( bytes((c,)) for c in range(0x80, 0xFF) ) \
+    + tuple( bytes((0x01, c)) for c in range(0x41, 0x60) )
+
+#   Characters for unquoted ``DATA`` items.
+DATA_CHARS = tuple( bytes((c,)) for c in b'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    b'abcdefghijklmnopqrstuvwxyz0123456789 .-' )
+
+class Generator:
+    ''' Generate the tokenized data for lines of a synthetic program
+        from random number generator `rng`.
+    '''
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def text(self, chars, lo, hi):
+        ' Return `lo` to `hi` random characters from `chars`. '
+        return b''.join(self.rng.choices(chars, k=self.rng.randint(lo, hi)))
+
+    def number(self):
+        ' Return a random numeric constant, with a ``-`` if negative. '
+        r = self.rng
+        kind = r.randrange(6)
+        if kind == 0:   return encode_int(r.randrange(10))
+        if kind == 1:   return encode_int(r.randrange(10, 256))
+        if kind == 2:   return TOKBYTES['-'] + encode_int(r.randrange(32768))
+        if kind == 3:   return encode_hex(r.randrange(0x10000))
+        if kind == 4:   return encode_oct(r.randrange(0x10000))
+        digits = str(r.randrange(10**16))
+        cut = r.randrange(len(digits))
+        return encode_real(digits[:cut], digits[cut:],
+            r.randrange(-20, 20), r.randrange(2))
+
+    def string(self):
+        return b'"' + self.text(TEXT_CHARS, 0, 40) + b'"'
+
+    def statement(self, lineno, last):
+        ''' Return a random statement for line `lineno`, which is used
+            as the target of any ``GOTO``. A ``REM`` takes the rest of
+            the line, so one is generated only if this is the `last`
+            statement in the line.
+        '''
+        r = self.rng
+        kind = r.randrange(6 if last else 5)
+        if kind == 0:
+            return TOKBYTES['PRINT'] + b' ' + self.string() \
+                + b';' + self.string()
+        if kind == 1:
+            items = [ self.string() if r.randrange(3) == 0
+                      else self.text(DATA_CHARS, 1, 12)
+                      for _ in range(r.randint(1, 8)) ]
+            return TOKBYTES['DATA'] + b' ' + b','.join(items)
+        if kind == 2:
+            expr = TOKBYTES['+'].join(
+                self.number() for _ in range(r.randint(1, 6)) )
+            return b'A' + TOKBYTES['='] + expr
+        if kind == 3:
+            return TOKBYTES['GOTO'] + encode_lineno(lineno)
+        if kind == 4:
+            return b' '.join(r.choices(PLAIN_TOKENS, k=r.randint(1, 8)))
+        rem = TOKBYTES['REM'] if r.randrange(2) else TOKBYTES["'"]
+        return rem + b' ' + self.text(TEXT_CHARS, 0, 60)
+
+    def line(self, lineno):
+        ' Return the tokenized data for a random line `lineno`. '
+        n = self.rng.randint(1, 4)
+        return b':'.join( self.statement(lineno, i == n - 1)
+            for i in range(n) )
+
+def synthetic_tlines(nlines=None, *, seed=0, txttab=TLines.TXTTAB_8080,
+        inc=10, limit=0x10000):
+    ''' Return a `TLines` at `txttab` of a random program generated from
+        `seed`, with lines numbered from `inc` in steps of `inc`.
+
+        Lines are added until there are `nlines` of them, the next line
+        number would be greater than `MAX_LINENO`, or the next line would
+        end at or past address `limit`. With the default `nlines` of
+        `None`, this is the largest program that fits in memory.
+    '''
+    gen = Generator(random.Random(seed))
+    tl = TLines(txttab=txttab)
+    addr = txttab + 2                   # allow for the end marker
+    lineno = inc
+    while (nlines is None or len(tl) < nlines) and lineno <= MAX_LINENO:
+        data = gen.line(lineno)
+        addr += 2 + 2 + len(data) + 1
+        if addr >= limit:
+            break
+        tl.setline(lineno, data)
+        lineno += inc
+    return tl
+
+####################################################################
+#   Benchmarks
+
+Benchmark = namedtuple('Benchmark', 'name unit setup')
+Benchmark.__doc__ = \
+    ''' A benchmark `name`, its rate measured in `unit` per second.
+        `setup` is called with the `TLines` to be used and returns a
+        function of no arguments to be timed, and the number of units
+        each call to that function processes.
+    '''
+
+def _parsetext(lazy):
+    def setup(tl):
+        text = tl.text()
+        return (lambda: TLines(text, txttab=tl.txttab, lazy=lazy), len(tl))
+    return setup
+
+def _text(tl):
+    ''' `TLines.text()` is cached, so alternate `txttab` between two
+        values to have each call regenerate the whole program image.
+    '''
+    tl = TLines(tl.text(), txttab=tl.txttab)
+    txttabs = (tl.txttab, tl.txttab - 1)
+    def run():
+        tl.txttab = txttabs[tl.txttab == txttabs[0]]
+        tl.text()
+    return (run, len(tl))
+
+def _detok(charset, expand):
+    def setup(tl):
+        cs = None if charset is None else CHARMAP[charset]
+        return (lambda: detokenize_program(tl, cs, expand), len(tl))
+    return setup
+
+def _basdump(render):
+    def setup(tl):
+        bf = BASFile(b'\xFF' + tl.text(), 'MSX')
+        run = lambda: ''.join(render(bf, tl.txttab))
+        return (run, len(run()))
+    return setup
+
+BENCHMARKS = (
+    Benchmark('parsetext',          'line',     _parsetext(False)),
+    Benchmark('parsetext-lazy',     'line',     _parsetext(True)),
+    Benchmark('text',               'line',     _text),
+    Benchmark('detok',              'line',     _detok(None, False)),
+    Benchmark('detok-expand',       'line',     _detok(None, True)),
+    Benchmark('detok-ja',           'line',     _detok('ja', False)),
+    Benchmark('detok-ja-expand',    'line',     _detok('ja', True)),
+    Benchmark('basdump',            'char',     _basdump(render_text)),
+    Benchmark('basdump-json',       'char',     _basdump(render_json)),
+)
+
+def run_benchmarks(tlines, *, repeat=5, names=None):
+    ''' Run each of the `BENCHMARKS` on `TLines` `tlines`, or only those
+        named in `names`, returning a `dict` of each name and its rate in
+        units per second. Each benchmark is run `repeat` times and the
+        fastest run is used, as the slower ones are slowed by other
+        activity on the machine rather than by the code.
+
+        A `KeyError` is raised for an unknown name in `names`.
+    '''
+    bynames = { b.name: b for b in BENCHMARKS }
+    if names is None:
+        names = list(bynames)
+    benchmarks = [ bynames[name] for name in names ]
+    rates = {}
+    for b in benchmarks:
+        run, units = b.setup(tlines)
+        best = min(Timer(run).repeat(repeat, number=1))
+        rates[b.name] = units / best
+    return rates
+
+####################################################################
+#   Baselines
+
+def results_info(tlines):
+    ''' Return a `dict` describing the conditions for results measured
+        with `tlines`: the Python implementation and version, the
+        machine, and the size of the program.
+    '''
+    return {
+        'python':   '{} {}'.format(platform.python_implementation(),
+                        platform.python_version()),
+        'machine':  platform.platform(),
+        'lines':    len(tlines),
+        'bytes':    len(tlines.text()),
+    }
+
+def save_results(path, info, rates):
+    ' Save `info` and `rates` as JSON in file `path`. '
+    with open(path, 'w', encoding='UTF-8') as f:
+        json.dump({ 'info': info, 'rates': rates }, f, indent=4,
+            sort_keys=True)
+        f.write('\n')
+
+def load_results(path):
+    ''' Return the ``(info, rates)`` saved by `save_results()` in `path`.
+        A `ValueError` is raised if the file is not a saved result.
+    '''
+    with open(path, encoding='UTF-8') as f:
+        results = json.load(f)
+    try:
+        return (results['info'], results['rates'])
+    except (KeyError, TypeError):
+        raise ValueError('{}: not a saved benchmark result'.format(path)) \
+            from None
+
+Regression = namedtuple('Regression', 'name baseline rate')
+Regression.__doc__ = \
+    ''' Benchmark `name` has slowed from `baseline` to `rate`. '''
+
+def regressions(baseline, rates, tolerance=0.2):
+    ''' Compare `rates` with `baseline` (both as returned by
+        `run_benchmarks()`), returning a list of `Regression` for each
+        benchmark whose rate is more than `tolerance` (a fraction) below
+        its baseline. Benchmarks missing from either are not compared.
+    '''
+    return [ Regression(name, baseline[name], rate)
+        for name, rate in rates.items()
+        if name in baseline and rate < baseline[name] * (1 - tolerance) ]
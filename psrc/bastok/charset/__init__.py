@@ -7,8 +7,19 @@
     as b'\x01\x45'. Encoding/decoding should be done by the system-specific
     parsing routines.
 
+    A `Charset` can also convert whole `bytes` of native code points to
+    and from `str` with `decode()` and `encode()`, and provide a Python
+    codec (see `codec_info()`) doing the same; these use the C
+    implementation of the standard ``charmap`` codec.
+
+    A `CharsetMap` holds a set of named charsets, building each only when
+    it is first used.
+
 '''
 
+from    collections.abc  import Mapping
+import  codecs
+
 class Charset:
     ''' A mapping between a native character set (`int` code points 0x00
         through 0xFF) and an arbitrary set of Unicode characters (`str`s of
@@ -40,6 +51,8 @@ class Charset:
         self.description = description
         self._nu = {}   # native (int) to Unicode (str) map
         self._un = {}   # Unicode (str) to native (int) map
+        self._dtable = None     # charmap codec tables, built on demand
+        self._etable = None
         for m in maps: self.setchars(m)
         nlen = len(self._nu); ulen = len(self._un)
         if not (nlen == ulen == 0x100):
@@ -75,6 +88,7 @@ class Charset:
            #        .format(ord(u), hex(n), ord(u), hex(self._un[u])))
             self._nu[n] = u
             self._un[u] = n
+        self._dtable = self._etable = None
 
     def trans(self, n):
         ''' Given a native code point `n` (`int` from 0x00 through 0xFF),
@@ -98,6 +112,60 @@ class Charset:
         self._ucheck(u)
         return self._un[u]
 
+    def decoding_table(self):
+        ''' Return the `str` of the 256 Unicode characters for native code
+            points 0x00 through 0xFF, as used by `codecs.charmap_decode()`.
+        '''
+        if self._dtable is None:
+            self._dtable = ''.join( self._nu[n] for n in range(0x100) )
+        return self._dtable
+
+    def encoding_table(self):
+        ' Return the `codecs.charmap_build()` table for `encode()`. '
+        if self._etable is None:
+            self._etable = codecs.charmap_build(self.decoding_table())
+        return self._etable
+
+    def decode(self, bs):
+        ''' Return the `str` of Unicode characters for the native code
+            points in `bs`. As with `trans()`, these are code points, not
+            encoded characters.
+        '''
+        return codecs.charmap_decode(bs, 'strict', self.decoding_table())[0]
+
+    def encode(self, s, errors='strict'):
+        ''' Return the `bytes` of native code points for the Unicode
+            characters in `s`. A `UnicodeEncodeError` (a `ValueError`) is
+            raised for characters not in this charset unless `errors`
+            is a different codec error handler.
+        '''
+        return codecs.charmap_encode(s, errors, self.encoding_table())[0]
+
+    def codec_info(self, name):
+        ''' Return a `codecs.CodecInfo` named `name` for a codec
+            converting between this charset's native code points and
+            Unicode, suitable for return from a `codecs.register()`
+            search function.
+        '''
+        dtable = self.decoding_table()
+        etable = self.encoding_table()
+
+        def encode(input, errors='strict'):
+            return codecs.charmap_encode(input, errors, etable)
+        def decode(input, errors='strict'):
+            return codecs.charmap_decode(input, errors, dtable)
+
+        class IncrementalEncoder(codecs.IncrementalEncoder):
+            def encode(self, input, final=False):
+                return encode(input, self.errors)[0]
+        class IncrementalDecoder(codecs.IncrementalDecoder):
+            def decode(self, input, final=False):
+                return decode(input, self.errors)[0]
+
+        return codecs.CodecInfo(encode, decode, name=name,
+            incrementalencoder=IncrementalEncoder,
+            incrementaldecoder=IncrementalDecoder)
+
 ####################################################################
 #   Generic charsets for special purposes
 
@@ -138,6 +206,40 @@ class UTCharset:
         return ord(u) - self.offset
 
 
+####################################################################
+#   Collections of charsets
+
+class CharsetMap(Mapping):
+    ''' A read-only mapping of names to charsets, each constructed only
+        when it is first looked up and then cached.
+
+        `factories` is a `dict` of each name and a function of no
+        arguments that returns its charset (usually a `Charset` or
+        `Unimplemented`). Iterating over the names, `len()` and ``in``
+        construct nothing; `items()` and `values()` construct every
+        charset.
+    '''
+
+    def __init__(self, factories):
+        self._factories = dict(factories)
+        self._built = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._built[name]
+        except KeyError:
+            pass
+        cs = self._built[name] = self._factories[name]()
+        return cs
+
+    def __iter__(self):     return iter(self._factories)
+    def __len__(self):      return len(self._factories)
+    def __contains__(self, name):   return name in self._factories
+
+    def built(self):
+        ' Return the names of the charsets constructed so far. '
+        return tuple( k for k in self._factories if k in self._built )
+
 ####################################################################
 #   Utility functions
 
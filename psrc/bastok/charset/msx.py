@@ -1,6 +1,8 @@
 from    bastok.charset  import *
+import  codecs
+import  re
 
-__all__ = [ 'Charset', 'CHARMAP' ]
+__all__ = [ 'Charset', 'CHARMAP', 'decode_string', 'encode_string' ]
 
 ####################################################################
 #   Characters used for blank glyphs.
@@ -122,13 +124,69 @@ C_JA = tuple(zip(range(0x00, 0x20), LO_ja)) \
 
 ####################################################################
 #   Dictionary of all standard charset/Unicode mappings
+#
+#   Each charset is constructed the first time it is looked up, so
+#   programs pay only for the charsets they use.
+
+CHARMAP = CharsetMap({
+    'int':  lambda: Charset('International (North America/Europe)', C_INT),
+    'ja':   lambda: Charset('Japanese (MSX2)', C_JA),
+    'ja1':  lambda: Unimplemented('ja1', 'Japanese (MSX1, different hiragana)'),
+    'ar':   lambda: Unimplemented('ar', 'Arabic'),
+    'pt':   lambda: Unimplemented('pt', 'Portuguese (Brazil)'),
+    'BR':   lambda: Unimplemented('BR', "alias for 'pt'"),
+    'ru':   lambda: Unimplemented('ru', 'Russian'),
+})
 
-CHARMAP = {
-    'int':  Charset('International (North America/Europe)', C_INT),
-    'ja':   Charset('Japanese (MSX2)', C_JA),
-    'ja1':  Unimplemented('ja1', 'Japanese (MSX1, different hiragana)'),
-    'ar':   Unimplemented('ar', 'Arabic'),
-    'pt':   Unimplemented('pt', 'Portuguese (Brazil)'),
-    'BR':   Unimplemented('BR', "alias for 'pt'"),
-    'ru':   Unimplemented('ru', 'Russian'),
-}
+####################################################################
+#   Codecs and MSX-BASIC string encoding
+#
+#   Each implemented charset is available as a Python codec named
+#   ``msx-`` followed by its `CHARMAP` key, e.g. ``b'\x91'.decode('msx-ja')``.
+#   These convert code points only; `decode_string()` and `encode_string()`
+#   additionally handle MSX-BASIC's encoding of code points 0x00-0x1F as
+#   0x01 followed by the code point plus 0x40.
+
+CODEC_PREFIX = 'msx_'           # as normalized by codecs.lookup()
+
+def codec_search(name):
+    ''' A `codecs.register()` search function returning the codec for
+        ``msx-``\ *key* (or ``msx_``\ *key*) where *key* is a `CHARMAP`
+        key for an implemented charset, or `None` for any other `name`.
+    '''
+    if not name.startswith(CODEC_PREFIX):
+        return None
+    key = name[len(CODEC_PREFIX):]
+    cs = CHARMAP.get(key)
+    if not isinstance(cs, Charset):
+        return None
+    return cs.codec_info('msx-' + key)
+
+codecs.register(codec_search)
+
+#   Bytes that may not appear in an encoded string: control characters
+#   other than an 0x01 that starts an extended code.
+BAD_STRING_BYTES = re.compile(rb'[\x00\x02-\x1F\x7F]|\x01(?![\x40-\x5F])')
+EXTENDED_CODE = re.compile(rb'\x01([\x40-\x5F])')
+CONTROL_CODE = re.compile(rb'[\x00-\x1F]')
+
+def decode_string(cs, bs):
+    ''' Decode `bs`, the encoded MSX-BASIC text of a string (e.g., the
+        contents of a string constant or a ``REM``), to a Unicode `str`
+        using `Charset` `cs`. A `ValueError` is raised if `bs` contains
+        control characters or invalid 0x01 extended code sequences.
+    '''
+    bad = BAD_STRING_BYTES.search(bs)
+    if bad:
+        raise ValueError('Bad MSX string encoding at offset {}: {}'
+            .format(bad.start(), bs[bad.start():bad.start()+2]))
+    return cs.decode(
+        EXTENDED_CODE.sub(lambda m: bytes((m[1][0] - 0x40,)), bs))
+
+def encode_string(cs, s):
+    ''' Encode Unicode `str` `s` to MSX-BASIC string text using `Charset`
+        `cs`; the reverse of `decode_string()`. A `UnicodeEncodeError`
+        is raised if `s` contains characters not in `cs`.
+    '''
+    return CONTROL_CODE.sub(lambda m: bytes((0x01, m[0][0] + 0x40)),
+        cs.encode(s))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+#
+#   basbench - benchmark bastok on a synthetic MSX-BASIC program
+#
+#   The results can be saved as a baseline and later runs compared with
+#   it; the exit status is 1 if any benchmark is slower than its baseline
+#   by more than the tolerance. Baselines are meaningful only on the
+#   machine and Python version that made them.
+#
+
+from    argparse  import ArgumentParser
+import  sys
+
+from    bastok.bench  import BENCHMARKS, load_results, regressions, \
+        results_info, run_benchmarks, save_results, synthetic_tlines
+
+def die(exitcode, *msglines):
+    for l in msglines:
+        print(l, file=sys.stderr)
+    exit(exitcode)
+
+def parseargs():
+    p = ArgumentParser(description='bastok performance benchmarks')
+    arg = p.add_argument
+
+    arg('-n', '--lines', type=int,
+        help='number of program lines (default: as many as fit in memory)')
+    arg('-s', '--seed', type=int, default=0,
+        help='random seed for generating the program (default: 0)')
+    arg('-r', '--repeat', type=int, default=5,
+        help='runs of each benchmark; the fastest is used (default: 5)')
+    arg('-b', '--baseline',
+        help='compare the results with those saved in this file')
+    arg('-t', '--tolerance', type=float, default=20,
+        help='percentage slower than the baseline that is reported'
+            ' as a regression (default: 20)')
+    arg('-o', '--output',
+        help='save the results to this file for use as a baseline')
+    arg('benchmark', nargs='*',
+        help='benchmarks to run (default: all): {}'.format(
+            ', '.join( b.name for b in BENCHMARKS )))
+
+    return p.parse_args()
+
+def main():
+    args = parseargs()
+
+    baseline = None
+    if args.baseline is not None:
+        try:
+            binfo, baseline = load_results(args.baseline)
+        except (OSError, ValueError) as ex:
+            die(2, 'basbench: {}'.format(ex))
+
+    tlines = synthetic_tlines(args.lines, seed=args.seed)
+    info = results_info(tlines)
+    if baseline is not None and binfo != info:
+        print('Baseline conditions differ:')
+        for k in sorted(set(binfo) | set(info)):
+            if binfo.get(k) != info.get(k):
+                print('  {:8} {} -> {}'.format(k, binfo.get(k), info.get(k)))
+
+    try:
+        rates = run_benchmarks(tlines, repeat=args.repeat,
+            names=args.benchmark or None)
+    except KeyError as ex:
+        die(2, 'basbench: unknown benchmark: {}'.format(ex.args[0]))
+    units = { b.name: b.unit for b in BENCHMARKS }
+    print('{} lines, {} bytes'.format(info['lines'], info['bytes']))
+    for name, rate in rates.items():
+        line = '{:18} {:14,.0f} {}/s'.format(name, rate, units[name])
+        if baseline is not None and name in baseline:
+            line += '   {:+6.1f}%'.format(100 * (rate / baseline[name] - 1))
+        print(line)
+
+    if args.output is not None:
+        save_results(args.output, info, rates)
+
+    if baseline is not None:
+        slower = regressions(baseline, rates, args.tolerance / 100)
+        if slower:
+            die(1, *[ 'basbench: {} regressed: {:,.0f} -> {:,.0f} {}/s'
+                .format(r.name, r.baseline, r.rate, units[r.name])
+                for r in slower ])
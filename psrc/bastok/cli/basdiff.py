@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+#   basdiff - show the line differences between two tokenized MS-BASIC
+#   programs
+#
+#   Lines are matched by line number and compared by their tokenized data,
+#   so unlike diffing `basdump` output, a change in the length of one line
+#   does not show up as changed next-line pointers on all following lines.
+#
+
+from    argparse  import ArgumentParser
+import  io
+import  sys
+
+from    bastok.charset.msx  import CHARMAP
+from    bastok.detok.msx2  import Detokenizer
+from    bastok.tldiff  import diff_tlines
+from    bastok.tlines  import TLines, BASFile
+
+def die(exitcode, *msglines):
+    for l in msglines:
+        print(l, file=sys.stderr)
+    exit(exitcode)
+
+def parseargs():
+    p = ArgumentParser(description='MS-BASIC tokenized program diff')
+    arg = p.add_argument
+
+    arg('-c', '--charset',
+        help='show lines detokenized with this MSX charset: ja, int, etc.'
+            ' (default: show tokenized data in hex)')
+    arg('-q', '--brief', action='store_true',
+        help='report only whether the programs differ')
+    arg('old', help='old file (required); use `-` for stdin')
+    arg('new', help='new file (required); use `-` for stdin')
+
+    return p.parse_args()
+
+def read_tlines(path):
+    ' Read and lazily parse the ``.BAS`` file at `path`. '
+    if path == '-':
+        data = sys.stdin.buffer.read()
+    else:
+        with open(path, 'rb') as f:
+            data = f.read()
+    bf = BASFile(data, 'MSX')
+    txttab = bf.addr()
+    if txttab is None:
+        txttab = TLines.TXTTAB_8080
+    return TLines(bf.txttab(), txttab=txttab, lazy=True)
+
+def lineformatter(cmap):
+    ''' Return a function formatting a line number and its tokenized data
+        for output: detokenized with `cmap`, or in hex if `cmap` is `None`
+        or the data cannot be detokenized.
+    '''
+    detok = None if cmap is None else Detokenizer(cmap, b'')
+    def fmt(lineno, data):
+        if detok is not None:
+            detok.setline(data, lineno)
+            try:
+                return detok.detokenized()
+            except (Detokenizer.TokenError, Detokenizer.ParseError,
+                    RuntimeError):
+                pass
+        return '{} {}'.format(lineno,
+            ' '.join( '{:02X}'.format(b) for b in data ))
+    return fmt
+
+def main():
+    args = parseargs()
+
+    cmap = None
+    if args.charset is not None:
+        cmap = CHARMAP.get(args.charset)
+        if cmap is None:
+            die(3, 'Unknown MSX charset: {}'.format(args.charset),
+                'Known charsets:',
+                *[ ' {:>4}: {}'.format(k, v.description)
+                   for k, v in sorted(CHARMAP.items()) ]
+                )
+
+    try:
+        diffs = diff_tlines(read_tlines(args.old), read_tlines(args.new))
+    except (OSError, ValueError) as ex:
+        die(2, 'basdiff: {}'.format(ex))
+    if not diffs:
+        return
+    if args.brief:
+        print('Programs {} and {} differ'.format(args.old, args.new))
+        exit(1)
+
+    #   Written as UTF-8 rather than letting the locale decide.
+    out = io.TextIOWrapper(sys.stdout.buffer, encoding='UTF-8', newline='\n')
+    fmt = lineformatter(cmap)
+    out.write('--- {}\n+++ {}\n'.format(args.old, args.new))
+    for d in diffs:
+        if d.old is not None:
+            out.write('-{}\n'.format(fmt(d.lineno, d.old)))
+        if d.new is not None:
+            out.write('+{}\n'.format(fmt(d.lineno, d.new)))
+    out.flush()
+    out.detach()
+    exit(1)
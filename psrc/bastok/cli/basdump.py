@@ -4,96 +4,24 @@
 #
 #   This understands the MS-BASIC binary file and in-memory format and
 #   splits the lines based on where the BASIC lines start, rather than
-#   at arbitrary 16-byte intervals.
+#   at arbitrary 16-byte intervals; see `bastok.dump`.
+#
+#   The whole dump is written as UTF-8 (the user's locale is ignored)
+#   through a single buffered stream.
 #
 
 from    argparse  import ArgumentParser
-from    itertools  import islice
-from    struct  import unpack
+import  io
 import  sys
 
+from    bastok.dump  import RENDERERS
 from    bastok.tlines  import BASFile
 
-
-def eprint(*args):
-    ' Print without newline at end. '
-    print(*args, end='')
-
-def sprint(n):
-    ' Print `n` spaces. '
-    print(n * ' ', end='')
-
-def aprint(i_addr):
-    ' Print address prefix for line. '
-    print('{:04X}:'.format(i_addr), end='')
-
-def hprint(bs):
-    ' Print hexdump bytes, each prefixed by a space. '
-    for b in bs:
-        print(' {:02X}'.format(b), end='')
-
-def vprint(bs):
-    ' Print "visible" characters. '
-    print(''.join(list(map(vis, bs))), end='')
-
-CONTROL_PICS = (
-    '␀', '␁', '␂', '␃', '␄', '␅', '␆', '␇',
-    '␈', '␉', '␊', '␋', '␌', '␍', '␎', '␏',
-    '␐', '␑', '␒', '␓', '␔', '␕', '␖', '␗',
-    '␘', '␙', '␚', '␛', '␜', '␝', '␞', '␟'
-)
-CONTROL_VIS = (
-    '₀', '₁', '₂', '₃', '₄', '₅', '₆', '₇',
-    '₈', '₉', 'ₐ', '⋅', '⋅', '⋅', 'ₑ', '⋅',
-    '¹', '²', '³', '⁴', '⁵', '⁶', '⁷', '⁸',
-    '⁹', '⋅', '⋅', '⋅', '⋅', '⋅', '⋅', '⋅'
-)
-
-def vis(b):
-    ' Return "visible" version of character code `b`. '
-    if b  < 0x20:       return CONTROL_VIS[b]
-    if b  < 0x7F:       return chr(b)   # printable ASCII: the char itself
-    pass;               return '▥'      # token: cross-hatched box
-
-def printbasline(i_addr, bf):
-    nextaddr = bf.read(2)
-    i_nextaddr = unpack('<H', nextaddr)[0]
-    if i_nextaddr == 0:
-        aprint(i_addr)
-        hprint(nextaddr)
-        return None
-
-    lineno = bf.read(2)
-    i_lineno = unpack('<H', lineno)[0]
-    aprint(i_addr)
-    sprint(36)
-    hprint(nextaddr)
-    hprint(lineno)
-    sprint(3)
-    fill = '─' * (10 - len(str(i_lineno)))
-    print('─── {}: {}'.format(i_lineno, fill))
-
-    linelen = i_nextaddr - i_addr
-    line = bf.read(linelen - 4)      # include trailing $00
-
-    n = 16
-    chunks = [line[i:i + n] for i in range(0, len(line), n)]
-
-    i_curpos = i_addr + 4
-    for chunk in chunks:
-        aprint(i_curpos)
-        hprint(chunk)
-        sprint(3 * (n - len(chunk)))
-        sprint(3)
-        vprint(chunk)
-        print()
-        i_curpos += n
-
-    return i_addr + linelen
-
 def parseargs():
     p = ArgumentParser(description='MS-BASIC hexdump')
     arg = p.add_argument
+    arg('-f', '--format', choices=sorted(RENDERERS), default='text',
+        help='output format (default: text)')
     arg('input', help='input file (required); use `-` for stdin')
     return p.parse_args()
 
@@ -105,10 +33,6 @@ def main():
     bf = BASFile(f.read(), 'MSX')
     f.close()
 
-    eprint('HEAD:')
-    hprint(bf.header())
-    print()
-
     #   TODO: The initial current address should be auto-detected from the
     #   next-line address and the first line length, and/or overridden by
     #   a command-line parameter.
@@ -118,10 +42,13 @@ def main():
 
     #   TODO: This assumes little-endian format. We need to be able to do
     #   big-endian for 6800.
-    while True:
-        i_nextaddr = printbasline(i_addr, bf)
-        if i_nextaddr is None:
-            print()
-            break
-        else:
-            i_addr = i_nextaddr
+    out = io.TextIOWrapper(sys.stdout.buffer, encoding='UTF-8',
+        newline='\n', write_through=False)
+    try:
+        out.writelines(RENDERERS[args.format](bf, i_addr))
+    except ValueError as ex:
+        print('basdump: {}'.format(ex), file=sys.stderr)
+        sys.exit(1)
+    finally:
+        out.flush()
+        out.detach()
@@ -18,11 +18,28 @@
 
     This does not remove any "expansion" within the lines (such as
     additional spaces); use the retokenizer to do that.
+
+    Input is read and output written a line at a time, so files of
+    any size may be processed, including from stdin.
 '''
 
-from    sys import argv
+from    argparse  import ArgumentParser
+import  io
+import  sys
+
 from    bastok.blines  import blines
 
+def parseargs():
+    p = ArgumentParser(description='Join expanded BASIC source lines')
+    arg = p.add_argument
+    arg('input', help='input file (required); use `-` for stdin')
+    return p.parse_args()
+
 def main():
-    with open(argv[1], encoding='UTF-8') as f:
-        for l in blines(f.readlines()): print(l)
+    args = parseargs()
+    if args.input == '-':
+        f = io.TextIOWrapper(sys.stdin.buffer, encoding='UTF-8')
+    else:
+        f = open(args.input, encoding='UTF-8')
+    with f:
+        for l in blines(f): print(l)
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 
 from    argparse  import ArgumentParser
+from    pathlib  import Path
 import  sys
 
-from    bastok.tlines import TLines
-from    bastok.detok.msx2 import Detokenizer
+from    bastok.detok.batch  import detokenize_bytes, detokenize_files, \
+        Options, OutputCache
 from    bastok.charset.msx import CHARMAP
 
 def die(exitcode, *msglines):
@@ -24,7 +25,18 @@ def parseargs():
         help='add spaces for readability')
     arg('-z', '--dos-text', action='store_true',
         help='Use DOS textfile format (CR+LF EOL, ^Z at EOF)')
-    arg('input', help='input file (required); use `-` for stdin')
+    arg('-o', '--output-dir',
+        help='write output files to this directory, named after the inputs'
+            ' with suffix .ba0 (.ba1 with --expand, .baa with --binary);'
+            ' required for more than one input or a directory')
+    arg('-j', '--jobs', type=int,
+        help='number of processes for multiple inputs (default: CPU count)')
+    arg('-C', '--cache',
+        help='cache output in this directory, keyed by input contents'
+            ' and options, so unchanged inputs need not be detokenized again')
+    arg('input', nargs='+',
+        help='input file(s) or directories of *.bas files (required);'
+            ' use `-` for stdin')
 
     return p.parse_args()
 
@@ -46,28 +58,41 @@ def main():
                    for k, v in sorted(CHARMAP.items()) ]
                 )
 
-    if args.input == '-':
+    if args.output_dir is not None:
+        batch(args)
+        return
+    if len(args.input) > 1 or Path(args.input[0]).is_dir():
+        die(2, '--output-dir is required for multiple inputs or a directory')
+
+    if args.input[0] == '-':
         f = sys.stdin.buffer
     else:
-        f = open(args.input, 'rb')
-
-    type = f.read(1)[0]
-    if type != 0xFF:
-        raise RuntimeError('bad type byte ${:02X}'.format(type))
-    tl = TLines(f.read(), txttab=0x8001)  # XXX txttab should not be hard-coded
+        f = open(args.input[0], 'rb')
+    data = f.read()
     f.close()
 
     #   We always write in binary mode, printing `str` output explictly
     #   as UTF-8 rather than letting the locale decide.
-    out = sys.stdout.buffer
-    endline = b'\n';
-    if args.dos_text: endline = b'\r\n'
-    for lineno, tline in tl.lines():
-        detok = Detokenizer(cmap, tline, lineno, expand=args.expand)
-        line = detok.detokenized()
-        if not args.binary:
-            line = bytes(line, 'UTF-8')
-        out.write(line)
-        out.write(endline)
-    if args.dos_text:
-        out.write(b'\x1A')
+    try:
+        sys.stdout.buffer.write(
+            detokenize_bytes(data, cmap, args.expand, args.dos_text))
+    except ValueError as ex:
+        die(1, 'detok: {}'.format(ex))
+
+def batch(args):
+    if '-' in args.input:
+        die(2, 'stdin cannot be used with --output-dir')
+    options = Options(args.charset, args.expand, args.binary, args.dos_text)
+    cache = None if args.cache is None else OutputCache(args.cache)
+    try:
+        results = detokenize_files(args.input, args.output_dir, options,
+            jobs=args.jobs, cache=cache)
+    except ValueError as ex:
+        die(2, 'detok: {}'.format(ex))
+    errors = 0
+    for r in results:
+        if r.status not in ('cached', 'detokenized'):
+            print('detok: {}: {}'.format(r.input, r.status), file=sys.stderr)
+            errors += 1
+    if errors:
+        exit(1)
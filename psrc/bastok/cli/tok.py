@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+from    argparse  import ArgumentParser
+import  io
+import  sys
+
+from    bastok.blines  import blines
+from    bastok.tok.msx2  import Tokenizer, tokenize_program
+from    bastok.charset.msx  import CHARMAP
+
+def die(exitcode, *msglines):
+    for l in msglines:
+        print(l, file=sys.stderr)
+    exit(exitcode)
+
+def parseargs():
+    p = ArgumentParser(description='MSX-BASIC tokenizer')
+    arg = p.add_argument
+
+    arg('-b', '--binary', action='store_true',
+        help='input is in MSX encoding, e.g. a SAVE "...",A file'
+            ' or `detok --binary` output')
+    arg('-c', '--charset', default='ja',
+        help='MSX charset: ja (default), int, ar, ru, etc.')
+    arg('input', help='input file (required); use `-` for stdin')
+
+    return p.parse_args()
+
+def main():
+    args = parseargs()
+
+    if args.binary:
+        cmap = None
+    else:
+        cmap = CHARMAP.get(args.charset)
+        if cmap is None:
+            die(3, 'Unknown MSX charset: {}'.format(args.charset),
+                'Known charsets:',
+                *[ ' {:>4}: {}'.format(k, v.description)
+                   for k, v in sorted(CHARMAP.items()) ]
+                )
+
+    if args.input == '-':
+        f = sys.stdin.buffer
+    else:
+        f = open(args.input, 'rb')
+
+    #   The source is read a line at a time as it is tokenized, so only
+    #   the tokenized program is held in memory.
+    if args.binary:
+        lines = msx_lines(f)
+    else:
+        #   UTF-8 source, possibly in expanded format.
+        lines = blines(io.TextIOWrapper(f, encoding='UTF-8'))
+
+    try:
+        tl = tokenize_program(lines, cmap)
+    except Tokenizer.TokenError as ex:
+        die(1, 'tok: {}'.format(ex))
+    finally:
+        f.close()
+    tl.write_to(sys.stdout.buffer)
+
+def msx_lines(f):
+    ''' Generate the lines, without line endings, of binary stream `f`,
+        an MSX ASCII file: CR+LF line endings and a ^Z at EOF.
+    '''
+    for line in f:
+        line, eof, _ = line.partition(b'\x1A')
+        if line.endswith(b'\r\n'):    line = line[:-2]
+        elif line.endswith(b'\n'):     line = line[:-1]
+        yield line
+        if eof:
+            return
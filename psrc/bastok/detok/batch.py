@@ -0,0 +1,253 @@
+''' Batch detokenization of many files, with an output cache.
+
+    `detokenize_files()` detokenizes a collection of tokenized MSX-BASIC
+    files into an output directory, running the detokenizations on a
+    process pool. If given an `OutputCache`, output is saved under a key
+    made from a hash of the input file, the conversion options and the
+    detokenizer code itself, so rerunning on an unchanged collection
+    detokenizes nothing at all.
+
+    The process pool, hashing and temporary file modules are imported
+    only when they are used, to keep them out of the start-up time of
+    the ``detok`` command when it converts a single file.
+'''
+
+from    collections  import namedtuple
+from    pathlib  import Path
+from    types  import ModuleType
+import  os
+import  sys
+
+from    bastok.charset.msx  import CHARMAP
+from    bastok.detok.msx2  import LineCache, detokenize_program
+from    bastok.tlines  import TLines
+
+def detokenize_bytes(data, charset, expand=False, dos_text=False, *,
+        cache=None):
+    ''' Return the `bytes` of the detokenized version of `data`, the
+        contents of a tokenized MSX-BASIC ``.BAS`` file, as written by
+        the ``detok`` command.
+
+        `charset`, `expand` and `cache` are as for `detokenize_program()`.
+        Output is UTF-8 unless `charset` is `None`. If `dos_text` is true,
+        lines end with CR+LF and a ^Z is appended, otherwise lines end
+        with LF.
+        A `ValueError` is raised if the file type byte is not 0xFF.
+    '''
+    if data[:1] != b'\xFF':
+        raise ValueError('bad type byte ${:02X}'.format(data[0]) if data
+            else 'empty file')
+    #   XXX txttab should not be hard-coded
+    tl = TLines(data[1:], txttab=0x8001)
+    text = detokenize_program(tl, charset, expand,
+        endline='\r\n' if dos_text else '\n', cache=cache)
+    if charset is not None:
+        text = bytes(text, 'UTF-8')
+    if dos_text:
+        text += b'\x1A'
+    return text
+
+Options = namedtuple('Options', 'charset expand binary dos_text')
+Options.__doc__ = \
+    ''' Batch detokenization options: the `CHARMAP` key of the `charset`
+        (ignored if `binary`), and the `expand`, `binary` and `dos_text`
+        flags as for the ``detok`` command. (`binary` implies `dos_text`.)
+    '''
+
+def output_suffix(options):
+    ''' Return the filename suffix for output with `options`, following
+        the conventions in ``programs/README.md``: ``.baa`` for binary
+        output, ``.ba1`` for expanded output, otherwise ``.ba0``.
+    '''
+    if options.binary:  return '.baa'
+    if options.expand:  return '.ba1'
+    pass;               return '.ba0'
+
+#   Lines common to several files (with the same line number and data)
+#   are detokenized only once in each process.
+LINE_CACHE = LineCache()
+
+def _detokenize(data, options):
+    if options.binary:
+        return detokenize_bytes(data, None, dos_text=True, cache=LINE_CACHE)
+    return detokenize_bytes(data, CHARMAP[options.charset],
+        options.expand, options.dos_text, cache=LINE_CACHE)
+
+def _detokenize_path(path, options):
+    ' Process pool worker: return (output, None) or (None, error message). '
+    try:
+        return (_detokenize(Path(path).read_bytes(), options), None)
+    except Exception as ex:
+        return (None, '{}: {}'.format(type(ex).__name__, ex))
+
+####################################################################
+#   Output cache
+
+def code_modules():
+    ''' Return the modules whose source is included in the cache key, so
+        that changes to the detokenizer invalidate cached output: this
+        module and every `bastok` module it uses, directly or through
+        other `bastok` modules. These are found from the modules, and the
+        modules of the functions, classes and other objects, in each
+        module's namespace, so no list of them need be kept up to date.
+    '''
+    found = {}
+    todo = [__name__]
+    while todo:
+        name = todo.pop()
+        if name in found or name not in sys.modules:
+            continue
+        m = found[name] = sys.modules[name]
+        for v in vars(m).values():
+            if isinstance(v, ModuleType):
+                vname = v.__name__
+            else:
+                vname = getattr(v, '__module__', None)
+            if isinstance(vname, str) and vname.startswith('bastok.'):
+                todo.append(vname)
+    return tuple( found[name] for name in sorted(found) )
+
+def code_stamp():
+    ' Return a hash of the source of the detokenizer code. '
+    from hashlib import sha256
+    h = sha256()
+    for m in code_modules():
+        h.update(Path(m.__file__).read_bytes())
+    return h.hexdigest()
+
+class OutputCache:
+    ''' A content-addressed cache of detokenized output, stored as one
+        file per entry under directory `path`. Entries are written
+        atomically, so concurrent runs may share a cache.
+    '''
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.stamp = code_stamp()
+
+    def key(self, data, options):
+        ''' Return the cache key for detokenizing input file contents
+            `data` with `options`.
+        '''
+        from hashlib import sha256
+        h = sha256(self.stamp.encode('ASCII'))
+        h.update(repr(tuple(options)).encode('UTF-8'))
+        h.update(data)
+        return h.hexdigest()
+
+    def _entry(self, key):
+        return self.path.joinpath(key[:2], key)
+
+    def get(self, key):
+        ' Return the cached `bytes` for `key`, or `None` if not cached. '
+        try:
+            return self._entry(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, output):
+        ' Save `output` under `key`. '
+        entry = self._entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        import tempfile
+        fd, tmp = tempfile.mkstemp(dir=str(entry.parent))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(output)
+        os.replace(tmp, str(entry))
+
+####################################################################
+#   Batch processing
+
+Result = namedtuple('Result', 'input output status')
+Result.__doc__ = \
+    ''' The result of detokenizing `input` to `output` (both `Path`s).
+        `status` is ``'cached'``, ``'detokenized'`` or an error message.
+    '''
+
+def input_files(paths, pattern='*.[Bb][Aa][Ss]'):
+    ''' Given `paths`, a sequence of files and directories, return a list
+        of ``(path, relpath)`` pairs: each file itself, and each file
+        matching `pattern` in or under each directory. `relpath` is the
+        output path relative to the output directory: the file's name,
+        or its path relative to the directory given.
+    '''
+    files = []
+    for p in map(Path, paths):
+        if p.is_dir():
+            files.extend( (f, f.relative_to(p))
+                for f in sorted(p.rglob(pattern)) if f.is_file() )
+        else:
+            files.append((p, Path(p.name)))
+    return files
+
+def _write(path, output):
+    ' Write `output` to `path` unless it already has that content. '
+    try:
+        if path.stat().st_size == len(output) and path.read_bytes() == output:
+            return
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(output)
+
+def detokenize_files(paths, outdir, options, *, jobs=None, cache=None):
+    ''' Detokenize the files given by `paths` (see `input_files()`) with
+        `Options` `options`, writing the output to files in `outdir` with
+        the `output_suffix()` for `options`. Output files that already
+        have the correct content are not rewritten.
+
+        Files not found in `cache`, an `OutputCache` or `None`, are
+        detokenized on a pool of `jobs` processes (default: the number of
+        CPUs), or in this process if `jobs` is 1. Return a list of
+        `Result` for each file, in the order given.
+
+        A `ValueError` is raised if two input files would be written to
+        the same output file.
+    '''
+    outdir = Path(outdir)
+    suffix = output_suffix(options)
+    results = []; outputs = set(); todo = []
+    for path, relpath in input_files(paths):
+        out = outdir.joinpath(relpath.with_suffix(suffix))
+        if out in outputs:
+            raise ValueError('{}: duplicate output file {}'.format(path, out))
+        outputs.add(out)
+        results.append(Result(path, out, None))
+        if cache is None:
+            todo.append((len(results) - 1, None))
+            continue
+        try:
+            key = cache.key(path.read_bytes(), options)
+        except OSError as ex:
+            results[-1] = results[-1]._replace(status=str(ex))
+            continue
+        output = cache.get(key)
+        if output is None:
+            todo.append((len(results) - 1, key))
+        else:
+            _write(out, output)
+            results[-1] = results[-1]._replace(status='cached')
+
+    if not todo:
+        return results
+    if jobs == 1 or len(todo) == 1:
+        done = ( _detokenize_path(results[i].input, options) for i, _ in todo )
+        pool = None
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(jobs)
+        done = pool.map(_detokenize_path,
+            [ results[i].input for i, _ in todo ], [options] * len(todo),
+            chunksize=max(1, len(todo) // (4 * (jobs or os.cpu_count() or 1))))
+    try:
+        for (i, key), (output, error) in zip(todo, done):
+            if error is not None:
+                results[i] = results[i]._replace(status=error)
+                continue
+            _write(results[i].output, output)
+            if cache is not None:
+                cache.put(key, output)
+            results[i] = results[i]._replace(status='detokenized')
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results
@@ -1,4 +1,8 @@
-from    struct  import unpack
+from    functools  import lru_cache
+import  re
+
+from    bastok.charset.msx  import decode_string
+from    bastok.numeric  import decode_number
 
 #   Token values mostly from MSX2 Technical Handbook, table 2.20.
 #   https://github.com/Konamiman/MSX2-Technical-Handbook/blob/master/md/Chapter2.md/#table-220--list-of-intermediate-codes
@@ -189,6 +193,20 @@ TOKENS = (
 #   its prefix.
 DETOKENS = sorted(TOKENS, key=lambda t: len(t[0]), reverse=True)
 
+def dispatch_table(detokens):
+    ''' Given `detokens`, a sequence of ``(bytes, keyword)`` pairs sorted
+        by descending length of the bytes, return a `dict` mapping each
+        first byte value to a tuple of the pairs starting with it, in the
+        same order. This lets a detokenizer try only the few tokens that
+        can match at the current position, rather than the whole table.
+    '''
+    table = {}
+    for t, s in detokens:
+        table.setdefault(t[0], []).append((t, s))
+    return { b: tuple(ts) for b, ts in table.items() }
+
+DETOKEN_DISPATCH = dispatch_table(DETOKENS)
+
 def tokbytes(s):
     ''' Return the bytes (1 or more) of the token for the given keyword `s`.
         The token must exist in the table or LookupError will be thrown.
@@ -210,7 +228,14 @@ T_QREM1 = tokbytes("'")[1]      # tokens for the single-quote alternative
 T_QREM2 = tokbytes("'")[2]      #   form of REM, without leading ':'
 T_ELSE1 = tokbytes('ELSE')[1]   # without leading ':'
 T_EQ    = tokbytes('=')[0]
-MAX_LINENO = 65529
+
+#   Runs of program text bytes that are generated as-is: ASCII other
+#   than quotes and colons, which need special handling, and control
+#   characters, which are numeric constants or invalid.
+PLAIN_TEXT  = re.compile(rb'[ !#-9;-\x7F]+')
+#   Runs of unquoted DATA argument text: up to the next quote, comma or
+#   colon.
+DATA_TEXT   = re.compile(rb'[^",:]+')
 
 class Detokenizer:
     ''' A detokenizer for MSX-BASIC. Instantiate this with a tokenized
@@ -235,12 +260,19 @@ class Detokenizer:
         if charset is not None:
             assert callable(charset.trans)
         self.charset = charset
+        self.expand = expand
+        self.setline(tline, lineno)
+
+    def setline(self, tline, lineno=None):
+        ''' Set a new tokenized line `tline` with line number `lineno`
+            (as for `__init__()`) to be detokenized, clearing the output.
+            This lets one `Detokenizer` be reused for a whole program.
+        '''
         self.tline = tline
         if lineno is None:
             self.lineno = None
         else:
             self.lineno = int(lineno)   # catch bad param early
-        self.expand = expand
         self.reset()
 
     def detokenized(self):
@@ -355,13 +387,20 @@ class Detokenizer:
 
     def parse_tline(self):
         ''' Generate the detokenized version of the tokenized line,
-            prefixed by `lineno` if that was provided.
+            prefixed by `lineno` if that was provided, and return it.
+        '''
+        self.generate_tline()
+        return self.output()
+
+    def generate_tline(self):
+        ''' Generate the detokenized version of the tokenized line,
+            prefixed by `lineno` if that was provided, leaving it as a
+            list of parts in `_output` rather than joining them.
         '''
         #   Allow use of these without `self.` prefix.
         def genasc(s):      return self.genasc(s)
         def terror():       return self.terror()
         def asc(*args):     return self.asc(*args)
-        def int16():        return self.int16()
 
         self.reset()
 
@@ -378,45 +417,13 @@ class Detokenizer:
                 #   MSX-BASIC does not have native chars < 0x20;
                 #   those code points are encoded as b'\x01\xNN` sequences.
                 terror()
-            elif b == 0x0B:
-                asc(b, '&O')
-                genasc(oct(int16())[2:].upper())
-            elif b == 0x0C:
-                asc(b, '&H')
-                genasc(hex(int16())[2:].upper())
             elif b == 0x0D:
                 #   Address in BASIC text area of destination line.
                 #   This conversion is done at/during (?) RUN.
                 raise RuntimeError('XXX write me: line address')
-            elif b == 0x0E:
-                asc(b, '')
-                i = int16()
-                if i > MAX_LINENO: terror()
-                genasc(str(i))
-            elif b == 0x0F:            # int 10-255 follows token
-                asc(b, '')
-                i = self.byte()
-                if i < 10: terror()
-                genasc(str(i))
-            elif b <= 0x1A:            # single-digit int
-                asc(b, str(b - 0x11))
-            elif b == 0x1B:            # unused
-                terror()
-            elif b == 0x1C:            # two-byte little-endian int 256-32767
-                asc(b, '')
-                i = int16()
-                if i < 256 or i > 32767: terror()
-                genasc(str(i))
-            elif b == 0x1D:
-                asc(b, '')
-                self.real(4)
-            elif b == 0x1E:
-                terror()
-            elif b == 0x1F:
-                asc(b, '')
-                self.real(8)
-            elif b < DQUOTE:
-                asc(b)
+            elif b <= 0x1F:
+                #   Numeric constants; 0x1B and 0x1E are unused.
+                self.number()
             #   $26 $42: binary numbers use ASCII `&B` followed by digits.
             elif b == DQUOTE:
                 asc(b)
@@ -424,7 +431,7 @@ class Detokenizer:
             elif b == COLON:
                 self.colon()
             elif b <= 0x7F:
-                asc(b)
+                self.plaintext()
             elif b == T_DATA:
                 asc(b, 'DATA')
                 self.expandsp()
@@ -437,13 +444,11 @@ class Detokenizer:
             elif self.token():
                 pass
             else:
-                parseerror()
-
-        return self.output()
+                self.parseerror()
 
     def match(self, bs):
         ' Are the next bytes in the input are `bs`? '
-        return self.tline[self.p:].startswith(bs)
+        return self.tline.startswith(bs, self.p)
 
     def peek(self):
         ''' Without consuming it, return the next byte in the input
@@ -488,12 +493,23 @@ class Detokenizer:
         '''
         for b in bs: self.byte(b)
 
+    def plaintext(self):
+        ''' Consume a run of ASCII program text that needs no special
+            handling and generate it with a single output part.
+        '''
+        end = PLAIN_TEXT.match(self.tline, self.p).end()
+        bs = self.tline[self.p:end]
+        self.p = end
+        if self.charset is None:
+            self._output.append(bs)
+        else:
+            self._output.append(str(bs, 'ASCII'))
+
     def remcontents(self):
         ''' Consume the remainder of tline and generate its
             charset-converted contents.
         '''
-        while self.peek() is not None:
-            self.char()
+        self.chars(len(self.tline))
 
     def colon(self):
         ''' Colon has some special cases when followed by a particular
@@ -523,105 +539,15 @@ class Detokenizer:
             #   It's just a colon.
             self.expandnl(); self.genasc(b); self.expandsp()
 
-    def int16(self):
-        ''' Consume two bytes and return them as an unsigned `int`. '''
-        i = unpack('<H', self.tline[self.p:self.p+2])[0]
-        self.p += 2
-        return i
-
-    def bcdstr(self, n):
-        ''' Given an unsigned byte value ($00-$FF), convert it to a `string`
-            of two decimal digits.
-        '''
-        lo = n & 0x0F
-        hi = (n & 0xF0) >> 4
-        if hi > 9 or lo > 9:
-            raise ValueError('Bad BCD byte: {:02X}'.format(n))
-        return str(hi) + str(lo)
-
-    def real(self, blen):
-        ''' Consume `blen` bytes, convert them to a real number and
-            generate it as output. `blen` must be 4 for single-precision or
-            8 for double-precision. The first byte is be the sign (bit 7)
-            and biased exponent (bits 0-6); the remaining bytes are pairs
-            of BCD digits.
-
-            Negative constants always store the sign as a ``-`` token ahead
-            of a positive constant, so this will raise an error if the sign
-            bit in the constant itself is negative.
-
-            Following MSX-BASIC, we print just a significand with a trailing
-            ``!`` (single-precision) or ``#`` (double-precision) if the
-            exponent is between -2 and +13 (as seen by the user), otherwise
-            we print in exponent form without a trailing type character.
-            (MSX-BASIC does not allow a trailing type character after an
-            exponent.)
-
-            When encoding an nEm format, MS-BASIC chooses single or double
-            precision based on the number of sig digs in the significand:
-            if it's ≤6 single precision is used; otherwise double precision
-            is used. However, with nDm format, MS-BASIC always encodes as
-            double precision.
-
-            Unlike MS-BASIC, for an encoded double in exponent form we
-            always produce nDm, whereas MS-BASIC uses nEm for ≤6 sig digs
-            in the significand. We do this so that we properly round-trip
-            tokenised → ASCII → tokenised; MS-BASIC doesn't do this.
-            This also helps with readability for humans.
+    def number(self):
+        ''' Consume a numeric constant, including its type byte, and
+            generate its text, as decoded by `decode_number()`.
         '''
-        bs = self.tline[self.p:self.p+blen]
-        self.p += blen
-
-        sign = bs[0] & 0x80
-        if sign:
-            raise TokenError('tokenized single prec may not be negative')
-        if blen == 4:
-            precchar = '!'
-            expchar  = 'E'
-        elif blen == 8:
-            precchar = '#'
-            expchar  = 'D'
-        else:
-            raise Exception('Internal error: len {} != 4 or 8'.format(bs))
-
-        #   Special case: all zeros is a zero value.
-        if bs == bytes(blen):
-            self.genasc('0' + precchar)
-            return
-        if bs[0] == 0x00:
-            #   This form causes the interpreter to wedge when loading the file.
-            raise TokenError('zero exponent with non-zero significand')
-
-        #     The exponent is biased by 0x40, so 0x40 is an exponent of 0
-        #   with the decimal point in front of all digits of the significand.
-        #   In other words, exponent 0x40 is 0.nnnnnn × 10⁰.
-        #     But note that in printed form, significand is multiplied by ten,
-        #   putting one digit before the decimal point, which requires
-        #   reducing the exponent by 1.
-        exponent = (bs[0] & 0x7F) - 0x40
-        significand = ''.join([self.bcdstr(b) for b in bs[1:]])
-        sigdigs = len(significand)
-       #print('exp', exponent, 'significand', significand, 'sigdigs', sigdigs)
-
-        #   We must not use Python's floating point here because, being binary
-        #   instead of BCD, it will occasionally round differently.
-        if exponent > 14 or exponent <= -2:
-            #   Exponent form with decimal point shifted one place to the right
-            #   for a "human-normalized" significand.
-            fraction = significand[1:].rstrip('0')
-            if fraction: fraction = '.' + fraction
-            self.genasc( '{}{}{}{:+d}'.format(
-                significand[0], fraction, expchar, exponent-1))
-        elif exponent == -1:
-            self.genasc('.0' + significand.rstrip('0') + precchar)
-        elif exponent == 0:
-            self.genasc('.' + significand.rstrip('0') + precchar)
-        elif exponent <= sigdigs:
-            #   We may have a decimal fractional part.
-            v = significand[0:exponent] + '.' + significand[exponent:]
-            self.genasc(v.rstrip('0').rstrip('.') + precchar)
-        else:
-            self.genasc(str(int(significand) * 10**(exponent-6)) + precchar)
+        try:
+            s, self.p = decode_number(self.tline, self.p)
+        except ValueError:
+            self.terror()
+        self.genasc(s)
 
     def char(self):
         ''' If we have a charset, consume a native-encoded char from the
@@ -653,20 +579,43 @@ class Detokenizer:
             else:                           # one-byte char code
                 self.generate(self.charset.trans(c))
 
+    def chars(self, end):
+        ''' Consume the input up to offset `end`, generating it as if by
+            repeated calls to `char()`.
+
+            If the charset supports it, the whole run is converted at once
+            with `decode_string()`, which is much faster than converting a
+            character at a time. If that fails we fall back to `char()`
+            to raise the error at the correct position.
+        '''
+        if self.p >= end:
+            return
+        if self.charset is None:
+            self.generate(self.tline[self.p:end])
+            self.p = end
+            return
+        if hasattr(self.charset, 'decode'):
+            try:
+                self.generate(
+                    decode_string(self.charset, self.tline[self.p:end]))
+                self.p = end
+                return
+            except ValueError:
+                pass
+        while self.p < end:
+            self.char()
+
     def quoted(self):
         ''' Consume and generate a quoted string, including the trailing
             quote if present, but not including the leading quote, which
             is assumed to have been consumed and generated already.
         '''
-        while True:
-            c = self.peek()
-            if c is None:                       # EOL ends quoted string
-                return
-            elif c == DQUOTE:                   # quote ends quoted string
-                self.genasc(self.byte())      # and is not charset-decoded
-                return
-            else:
-                self.char()
+        end = self.tline.find(DQUOTE, self.p)
+        if end < 0:                             # EOL ends quoted string
+            end = len(self.tline)
+        self.chars(end)
+        if self.peek() == DQUOTE:               # quote ends quoted string
+            self.genasc(self.byte())            # and is not charset-decoded
 
     def data(self):
         ''' Consume and generate bytes as a ``DATA`` statement argument.
@@ -708,7 +657,7 @@ class Detokenizer:
                 return
             else:
                 leading = False
-                self.char()
+                self.chars(DATA_TEXT.match(self.tline, self.p).end())
 
     #   Tokens that are preceeded by a space in expand mode.
     PRESPACE_KEYWORDS = [ 'THEN', 'TO', 'STEP', 'AND', 'OR', 'XOR', ]
@@ -718,10 +667,10 @@ class Detokenizer:
             ASCII text for it (with expansion if we're expanding)
             and return `True`. Otherwise return `False`.
         '''
-        for t, s in DETOKENS:
+        for t, s in DETOKEN_DISPATCH.get(self.peek(), ()):
             if not self.match(t):
                 continue
-            self.consume(t)
+            self.p += len(t)
             if s in self.PRESPACE_KEYWORDS: self.expandsp()
             self.genasc(s)
             next = self.peek()
@@ -729,3 +678,69 @@ class Detokenizer:
                 self.expandsp()
             return True
         return False
+
+class LineCache:
+    ''' A bounded LRU cache of detokenized lines, for detokenizing a
+        program repeatedly as it is edited, when most lines are unchanged
+        from the last time.
+
+        `detokenize()` returns the detokenized line for the tokenized line
+        data, line number, `Charset` (or `None`) and expand flag given,
+        detokenizing it only if it is not among the `maxsize` most
+        recently used. Lines that fail to detokenize are not cached.
+    '''
+
+    def __init__(self, maxsize=8192):
+        self._detokenizers = {}
+        self.detokenize = lru_cache(maxsize)(self._detokenize)
+
+    def _detokenize(self, tline, lineno, charset, expand):
+        dt = self._detokenizers.get((charset, expand))
+        if dt is None:
+            dt = self._detokenizers[(charset, expand)] \
+                = Detokenizer(charset, b'', expand=expand)
+        dt.setline(tline, lineno)
+        return dt.parse_tline()
+
+    def info(self):
+        ''' Return the cache statistics as a named tuple of `hits`,
+            `misses`, `maxsize` and `currsize`.
+        '''
+        return self.detokenize.cache_info()
+
+    def clear(self):
+        ' Empty the cache and reset the statistics. '
+        self.detokenize.cache_clear()
+
+def detokenize_program(tlines, charset, expand=False, *, endline='\n',
+        cache=None):
+    ''' Detokenize all the lines of `tlines`, a `TLines`, returning the
+        whole program as a single `str`, or `bytes` in MSX encoding if
+        `charset` is `None`. `charset` and `expand` are as for
+        `Detokenizer`. Each line is followed by `endline`, which is
+        encoded as ASCII for `bytes` output.
+
+        This is much faster than detokenizing each line separately: a
+        single `Detokenizer` is reused for every line and the output
+        parts of all lines are joined just once. If a `LineCache` `cache`
+        is given, lines are taken from it where possible instead.
+    '''
+    if charset is None:
+        empty = bytes()
+        endline = bytes(endline, 'ASCII')
+    else:
+        empty = str()
+    parts = []
+    if cache is not None:
+        detokenize = cache.detokenize
+        for lineno, tline in tlines.lines():
+            parts.append(detokenize(tline, lineno, charset, expand))
+            parts.append(endline)
+        return empty.join(parts)
+    dt = Detokenizer(charset, b'', expand=expand)
+    for lineno, tline in tlines.lines():
+        dt.setline(tline, lineno)
+        dt.generate_tline()
+        parts.extend(dt._output)
+        parts.append(endline)
+    return empty.join(parts)
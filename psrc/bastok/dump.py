@@ -0,0 +1,106 @@
+''' Hexdumps of tokenized MS-BASIC programs.
+
+    These understand the MS-BASIC binary file and in-memory format and
+    split the lines based on where the BASIC lines start, rather than at
+    arbitrary 16-byte intervals. `baslines()` parses the program text and
+    the `RENDERERS` produce the ``basdump`` command's output formats from
+    it, as an iterable of `str` to be written in order.
+
+    Each text row is formatted in one step from the `HEXBYTES` and
+    `VISCHARS` tables.
+'''
+
+from    codecs  import charmap_decode
+from    struct  import pack, unpack_from
+
+CONTROL_PICS = (
+    '␀', '␁', '␂', '␃', '␄', '␅', '␆', '␇',
+    '␈', '␉', '␊', '␋', '␌', '␍', '␎', '␏',
+    '␐', '␑', '␒', '␓', '␔', '␕', '␖', '␗',
+    '␘', '␙', '␚', '␛', '␜', '␝', '␞', '␟'
+)
+CONTROL_VIS = (
+    '₀', '₁', '₂', '₃', '₄', '₅', '₆', '₇',
+    '₈', '₉', 'ₐ', '⋅', '⋅', '⋅', 'ₑ', '⋅',
+    '¹', '²', '³', '⁴', '⁵', '⁶', '⁷', '⁸',
+    '⁹', '⋅', '⋅', '⋅', '⋅', '⋅', '⋅', '⋅'
+)
+
+def vis(b):
+    ' Return "visible" version of character code `b`. '
+    if b  < 0x20:       return CONTROL_VIS[b]
+    if b  < 0x7F:       return chr(b)   # printable ASCII: the char itself
+    pass;               return '▥'      # token: cross-hatched box
+
+#   Hexdump of each byte value, prefixed by a space.
+HEXBYTES = tuple( ' {:02X}'.format(b) for b in range(256) )
+#   Visible character for each byte value, as a charmap decoding table.
+VISCHARS = ''.join(map(vis, range(256)))
+
+ROWLEN = 16
+
+def hexstr(bs):
+    ' Return hexdump of `bs`, each byte prefixed by a space. '
+    return ''.join(map(HEXBYTES.__getitem__, bs))
+
+def visstr(bs):
+    ' Return "visible" characters of `bs`. '
+    return charmap_decode(bs, 'strict', VISCHARS)[0]
+
+def baslines(bf, addr):
+    ''' Parse the program text of `BASFile` `bf`, which starts at `addr`,
+        yielding ``(addr, nextaddr, lineno, data)`` for each line, where
+        `data` includes the terminating 0x00, and finally ``(addr, 0,
+        None, b'')`` for the end-of-program marker.
+
+        A `ValueError` is raised if the text is truncated or a next-line
+        pointer does not point past the start of its line.
+    '''
+    text = bf.txttab()
+    start = addr
+    while True:
+        offset = addr - start
+        if offset + 2 > len(text):
+            raise ValueError('${:04X}: missing end of program'.format(addr))
+        nextaddr = unpack_from('<H', text, offset)[0]
+        if nextaddr == 0:
+            yield (addr, 0, None, b'')
+            return
+        if nextaddr <= addr + 4 or nextaddr - start > len(text):
+            raise ValueError('${:04X}: bad next-line pointer ${:04X}'
+                .format(addr, nextaddr))
+        lineno = unpack_from('<H', text, offset + 2)[0]
+        yield (addr, nextaddr, lineno, text[offset+4:nextaddr-start])
+        addr = nextaddr
+
+def render_text(bf, addr):
+    ' Yield the rows of a hexdump of `bf`, starting at `addr`. '
+    yield 'HEAD:{}\n'.format(hexstr(bf.header()))
+    for addr, nextaddr, lineno, data in baslines(bf, addr):
+        if lineno is None:
+            yield '{:04X}: 00 00\n'.format(addr)
+            return
+        yield '{:04X}:{}{}   ─── {}: {}\n'.format(addr, ' ' * 36,
+            hexstr(pack('<HH', nextaddr, lineno)),
+            lineno, '─' * (10 - len(str(lineno))))
+        for i in range(0, len(data), ROWLEN):
+            row = data[i:i+ROWLEN]
+            yield '{:04X}:{:{width}}   {}\n'.format(addr + 4 + i,
+                hexstr(row), visstr(row), width=3*ROWLEN)
+
+def render_json(bf, addr):
+    ''' Yield a JSON document describing `bf`, starting at `addr`, with
+        one line record per output line.
+    '''
+    import json     # only here, to keep it out of text-mode start-up
+    yield '{{"header": "{}", "lines": ['.format(bf.header().hex().upper())
+    sep = '\n'
+    for addr, nextaddr, lineno, data in baslines(bf, addr):
+        if lineno is None:
+            yield '\n], "end": {}}}\n'.format(addr)
+            return
+        yield sep + json.dumps({ 'addr': addr, 'next': nextaddr,
+            'lineno': lineno, 'data': data[:-1].hex().upper() })
+        sep = ',\n'
+
+RENDERERS = { 'text': render_text, 'json': render_json }
@@ -0,0 +1,218 @@
+''' MSX-BASIC tokenized numeric constants.
+
+    Numeric constants in tokenized MSX-BASIC text are a type byte
+    followed by the value:
+
+      0x0B      octal ``&O`` constant: unsigned 16-bit little-endian
+      0x0C      hex ``&H`` constant: unsigned 16-bit little-endian
+      0x0E      line number (0-65529): unsigned 16-bit little-endian
+      0x0F      integer 10-255: one byte
+      0x11-0x1A integer 0-9: no value bytes
+      0x1C      integer 256-32767: 16-bit little-endian
+      0x1D      single precision real: 4 bytes
+      0x1F      double precision real: 8 bytes
+
+    Negative constants are stored as a ``-`` token followed by a positive
+    constant. Reals are an exponent byte biased by 0x40, for a significand
+    with the decimal point before its first digit, followed by the BCD
+    digits of the significand (6 for single precision, 14 for double).
+
+    `decode_number()` returns the text of a constant as the detokenizer
+    lists it and the `encode_*()` functions produce the tokenized form.
+    The BCD conversions use the precomputed `BCD_DIGITS` table rather
+    than converting the digits of each byte separately.
+'''
+
+from    struct  import pack
+
+MAX_LINENO = 65529
+
+#   The two decimal digits of each BCD byte value, or `None` for byte
+#   values that are not valid BCD.
+BCD_DIGITS = tuple( '{}{}'.format(b >> 4, b & 0x0F)
+    if b >> 4 <= 9 and b & 0x0F <= 9 else None for b in range(256) )
+
+#   Text of each integer constant value that fits in a byte.
+DECIMAL = tuple(map(str, range(256)))
+
+def bcdstr(bs):
+    ''' Return the `str` of the decimal digits of BCD `bytes` `bs`.
+        A `ValueError` is raised if any byte is not valid BCD.
+    '''
+    try:
+        return ''.join(map(BCD_DIGITS.__getitem__, bs))
+    except TypeError:
+        for b in bs:
+            if BCD_DIGITS[b] is None:
+                raise ValueError('Bad BCD byte: {:02X}'.format(b)) from None
+        raise
+
+####################################################################
+#   Decoding
+
+def decode_real(bs):
+    ''' Return the text of the real constant encoded in `bs`, 4 bytes for
+        single precision or 8 for double precision: the sign (bit 7) and
+        biased exponent (bits 0-6) byte followed by the BCD significand.
+        A `ValueError` is raised for a negative sign, non-zero significand
+        with a zero exponent or a bad BCD byte.
+
+        Following MSX-BASIC, the text is just a significand with a
+        trailing ``!`` (single precision) or ``#`` (double precision) if
+        the exponent is between -2 and +13 (as seen by the user),
+        otherwise it is in exponent form without a type character.
+
+        When encoding an nEm format, MSX-BASIC chooses single or double
+        precision based on the number of significant digits: single
+        precision if there are 6 or fewer, otherwise double precision.
+        With nDm format, it always encodes as double precision.
+
+        Unlike MSX-BASIC, for an encoded double in exponent form we
+        always produce nDm, whereas MSX-BASIC uses nEm for 6 or fewer
+        significant digits. This makes tokenised → ASCII → tokenised
+        round-trip, which MSX-BASIC does not do, and also helps with
+        readability for humans.
+    '''
+    blen = len(bs)
+    if blen == 4:
+        precchar = '!'; expchar = 'E'
+    elif blen == 8:
+        precchar = '#'; expchar = 'D'
+    else:
+        raise ValueError('Internal error: len {} != 4 or 8'.format(blen))
+
+    if bs[0] & 0x80:
+        raise ValueError('tokenized real may not be negative')
+    #   Special case: all zeros is a zero value.
+    if bs[0] == 0x00:
+        if bs.count(0) == blen:
+            return '0' + precchar
+        #   This form causes the interpreter to wedge when loading the file.
+        raise ValueError('zero exponent with non-zero significand')
+
+    #     The exponent is biased by 0x40, so 0x40 is an exponent of 0
+    #   with the decimal point in front of all digits of the significand.
+    #   In other words, exponent 0x40 is 0.nnnnnn × 10⁰.
+    #     But note that in printed form, significand is multiplied by ten,
+    #   putting one digit before the decimal point, which requires
+    #   reducing the exponent by 1.
+    exponent = bs[0] - 0x40
+    significand = bcdstr(bs[1:])
+
+    #   We must not use Python's floating point here because, being binary
+    #   instead of BCD, it will occasionally round differently.
+    if exponent > 14 or exponent <= -2:
+        #   Exponent form with decimal point shifted one place to the right
+        #   for a "human-normalized" significand.
+        fraction = significand[1:].rstrip('0')
+        if fraction: fraction = '.' + fraction
+        return '{}{}{}{:+d}'.format(
+            significand[0], fraction, expchar, exponent-1)
+    elif exponent == -1:
+        return '.0' + significand.rstrip('0') + precchar
+    elif exponent == 0:
+        return '.' + significand.rstrip('0') + precchar
+    elif exponent <= len(significand):
+        #   We may have a decimal fractional part.
+        v = significand[0:exponent] + '.' + significand[exponent:]
+        return v.rstrip('0').rstrip('.') + precchar
+    else:
+        return str(int(significand) * 10**(exponent-6)) + precchar
+
+def decode_number(bs, p=0):
+    ''' Decode the numeric constant starting with its type byte at offset
+        `p` in `bs`, returning a tuple of its text as listed by MSX-BASIC
+        and the offset after it.
+
+        A `ValueError` is raised if the byte at `p` is not a numeric
+        constant type byte, or if the constant is truncated or its value
+        is out of range or otherwise invalid for its type.
+    '''
+    t = bs[p]
+    try:
+        if 0x11 <= t <= 0x1A:
+            return (DECIMAL[t - 0x11], p + 1)
+        if t == 0x0F:
+            n = bs[p+1]
+            if n < 10:
+                raise ValueError('int {} too small for $0F'.format(n))
+            return (DECIMAL[n], p + 2)
+        if t in (0x0B, 0x0C, 0x0E, 0x1C):
+            n = bs[p+1] | bs[p+2] << 8
+            if t == 0x0B:
+                return ('&O{:o}'.format(n), p + 3)
+            if t == 0x0C:
+                return ('&H{:X}'.format(n), p + 3)
+            if t == 0x0E:
+                if n > MAX_LINENO:
+                    raise ValueError('line no. {} > {}'.format(n, MAX_LINENO))
+            elif n < 256:
+                raise ValueError('int {} too small for $1C'.format(n))
+            elif n > 32767:
+                raise ValueError('int {} too large for $1C'.format(n))
+            return (str(n), p + 3)
+        if t == 0x1D or t == 0x1F:
+            blen = 4 if t == 0x1D else 8
+            if p + 1 + blen > len(bs):
+                raise IndexError
+            return (decode_real(bs[p+1:p+1+blen]), p + 1 + blen)
+    except IndexError:
+        raise ValueError('truncated numeric constant') from None
+    raise ValueError('bad numeric constant type ${:02X}'.format(t))
+
+####################################################################
+#   Encoding
+
+def encode_int(n):
+    ''' Return the tokenized encoding of integer constant `n`, which must
+        be 0 through 32767.
+    '''
+    if n < 10:      return bytes((0x11 + n,))
+    if n < 256:     return bytes((0x0F, n))
+    pass;           return b'\x1C' + pack('<H', n)
+
+def encode_lineno(n):
+    ' Return the tokenized encoding of line number `n`. '
+    if not 0 <= n <= MAX_LINENO:
+        raise ValueError('line number > {}'.format(MAX_LINENO))
+    return b'\x0E' + pack('<H', n)
+
+def encode_hex(n):
+    ' Return the tokenized encoding of ``&H`` constant `n`. '
+    if not 0 <= n <= 0xFFFF:
+        raise ValueError('constant > &HFFFF')
+    return b'\x0C' + pack('<H', n)
+
+def encode_oct(n):
+    ' Return the tokenized encoding of ``&O`` constant `n`. '
+    if not 0 <= n <= 0xFFFF:
+        raise ValueError('constant > &HFFFF')
+    return b'\x0B' + pack('<H', n)
+
+def encode_real(intpart, frac, exp, double):
+    ''' Return the tokenized encoding of the real constant with integer
+        part and fraction digits `intpart` and `frac` (`str`s of decimal
+        digits, either of which may be empty) and decimal exponent `exp`.
+        It is single precision (6 digits) unless `double` is true (14
+        digits) and is rounded to that number of digits.
+
+        This is the encoding decoded by `decode_real()`, with its type
+        byte. A `ValueError` is raised if the exponent is out of range.
+    '''
+    ndigits = 14 if double else 6
+    prefix = b'\x1F' if double else b'\x1D'
+    digits = intpart + frac
+    sig = digits.lstrip('0')
+    if sig.rstrip('0') == '':                   # zero is all zero bytes
+        return prefix + bytes(1 + ndigits // 2)
+    exp += len(intpart) - (len(digits) - len(sig))
+    if len(sig) > ndigits:
+        rounded = str(int(sig[:ndigits]) + (sig[ndigits] >= '5'))
+        if len(rounded) > ndigits:              # carried into a new digit
+            rounded = rounded[:ndigits]
+            exp += 1
+        sig = rounded
+    if not (-0x3F <= exp <= 0x3F):
+        raise ValueError('exponent out of range')
+    return prefix + bytes((0x40 + exp,)) \
+        + bytes.fromhex(sig.ljust(ndigits, '0'))
@@ -0,0 +1,49 @@
+''' Structural comparison of tokenized BASIC programs.
+
+    `diff_tlines()` compares two `TLines` line by line: lines are matched
+    by line number and compared by their tokenized data alone, so a
+    change in one line's length, which moves every following line and
+    changes its next-line pointer, is reported only for the line that
+    changed.
+'''
+
+from    collections  import namedtuple
+
+ADDED   = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+LineDiff = namedtuple('LineDiff', 'status lineno old new')
+LineDiff.__doc__ = \
+    ''' A difference in line `lineno`: its `status` is `ADDED`, `REMOVED`
+        or `CHANGED`, and `old` and `new` are its tokenized data in the
+        old and new programs, or `None` if it is not in that program.
+    '''
+
+def diff_tlines(old, new):
+    ''' Compare `TLines` `old` and `new`, returning a list of `LineDiff`
+        for each line added, removed or changed, in line number order.
+
+        This is a single merge of the two sorted line indexes; line data
+        are compared without copying them, so this works well with
+        `TLines` parsed with ``lazy=True``.
+    '''
+    diffs = []
+    olines, nlines = old.linenos(), new.linenos()
+    omap, nmap = old.linemap, new.linemap
+    i = j = 0
+    while i < len(olines) or j < len(nlines):
+        o = olines[i] if i < len(olines) else None
+        n = nlines[j] if j < len(nlines) else None
+        if n is None or (o is not None and o < n):
+            diffs.append(LineDiff(REMOVED, o, old.getline(o), None))
+            i += 1
+        elif o is None or n < o:
+            diffs.append(LineDiff(ADDED, n, None, new.getline(n)))
+            j += 1
+        else:
+            if omap[o] != nmap[n]:
+                diffs.append(LineDiff(CHANGED, o,
+                    old.getline(o), new.getline(n)))
+            i += 1; j += 1
+    return diffs
@@ -1,3 +1,4 @@
+from    bisect  import bisect_left, bisect_right
 from    io  import BytesIO
 import  struct
 
@@ -19,14 +20,20 @@ class TLines:
         - `clearlines()`: Clear all lines and `orig_text`.
         - `parsetext()`: Add lines from a program image to the list.
         - `setline()`: Add a single line to the program image.
+        - `getline()`: Return the data for a single line.
         - `lines()`: Return the line numbers and data as a sequence
-          of``(int,bytes)`` tuples.
+          of``(int,bytes)`` tuples, optionally for only a range of lines.
+        - `len()` of a `TLines` is the number of lines.
+        - `lineaddr()`: Return the address of a line in the program image.
         - `text()`: Generate a program image starting at `txttab`.
         - `write_to()`: Write a filetype byte and program image to a stream.
 
         Attributes:
         - `linemap`: A dictionary mapping `int` line number to the line
-          data (without the terminating 0 byte).
+          data (without the terminating 0 byte). This must not be changed
+          directly; use `setline()`. Lines from a lazy `parsetext()` are
+          `memoryview`s of `orig_text` until read with `getline()` or
+          `lines()`.
         - `orig_text`: The original (pre-parse) text data this instance was
           instantiated with, if any (otherwise `None`). This should be the
           same as the result of `text()` if the original text was valid,
@@ -39,6 +46,12 @@ class TLines:
           8080 or 6502, but not for 6800.
         - `maxlin` defaults to 65529, which is correct for MSX-BASIC and
           GW-BASIC, but not for early 6502 BASIC (63999).
+
+        The line numbers are kept in a sorted index and the program image
+        is cached, along with the offset of each line in it. Changing a
+        line marks the image stale only from that line onward (or, if
+        its length is unchanged, just patches it), so editing many lines
+        and regenerating the image is not quadratic.
     '''
 
     MAXLIN_5 = 65529        # v5.x: MSX-BASIC, GW-BASIC
@@ -49,10 +62,12 @@ class TLines:
     TXTTAB_C64      = 0x0801
     TXTTAB_8080     = 0x8001    # Also Z80
 
-    def __init__(self, text=None, *, txttab=None, maxlin=MAXLIN_5):
+    def __init__(self, text=None, *, txttab=None, maxlin=MAXLIN_5,
+            lazy=False):
         ''' Create a list of tokenized lines starting at address `txttab`.
             if a `bytes` `text` is supplied, it will be parsed with
-            `parsetext()`, providing the initial set of lines.
+            `parsetext()` (passing on `lazy`), providing the initial set
+            of lines.
         '''
         self.maxlin = maxlin
 
@@ -64,14 +79,20 @@ class TLines:
 
         self.clearlines()
         if text is not None:
-             self.parsetext(text, txttab)
+             self.parsetext(text, txttab, lazy=lazy)
 
     def clearlines(self):
         ' Clear all lines and `orig_text`. '
         self.orig_text = None
         self.linemap = {}
-
-    def parsetext(self, text, txttab=None):
+        self._index = []            # sorted line numbers
+        self._offsets = []          # offset in image of each current line
+        self._image = bytearray()   # image of the current lines
+        self._current = 0           # no. of lines with current offset/image
+        self._imagetxttab = None    # txttab used to generate image
+        self._text = None           # cached text()
+
+    def parsetext(self, text, txttab=None, *, lazy=False):
         ''' Parse the given program image `text` into lines, adding them to
             the lines already held by this object. New lines with the same
             line number as an existing line will overwrite the existing line.
@@ -85,20 +106,34 @@ class TLines:
             Each line's data is checked to see that it ends with a 0x00
             termination byte; a `ValueError` will be raised if it does
             not, indicating either bad data or a bug in this function.
+            A `ValueError` is also raised if a next-line pointer does not
+            point past the start of its line.
+
+            If `lazy` is true the line data are not copied: each line is
+            stored as a `memoryview` slice of `text`, which is converted
+            to `bytes` only when the line is read with `getline()` or
+            `lines()`. This makes parsing a large program to read only a
+            few of its lines, or to count them, much cheaper.
         '''
         if txttab == None:
             txttab = self.txttab
         if self.orig_text is None:
             self.orig_text = text
+        if lazy:
+            text = memoryview(text)
 
         curaddr = txttab
         while True:
             offset = curaddr - txttab
-            naddr = unle(text[offset:])
+            naddr = unle_from(text, offset)
             if naddr == 0:
                 break
             noffset = naddr - txttab
-            lineno = unle(text[offset+2:])
+            lineno = unle_from(text, offset+2)
+            if noffset <= offset + 4:
+                raise ValueError(
+                    'line {} at addr ${:04X}: bad next-line pointer ${:04X}'
+                    .format(lineno, curaddr, naddr))
             termbyte = text[noffset-1]
             if termbyte != 0:
                 raise ValueError(
@@ -116,29 +151,102 @@ class TLines:
         if lineno < 0 or lineno > self.maxlin:
             raise ValueError('Line number {} out of range 0-{}'
                 .format(lineno, self.maxlin))
+        old = self.linemap.get(lineno)
         self.linemap[lineno] = bs
+        if old is None:
+            i = bisect_left(self._index, lineno)
+            self._index.insert(i, lineno)
+            self._current = min(self._current, i)
+        elif old == bs:
+            return
+        else:
+            i = bisect_left(self._index, lineno)
+            if i < self._current and len(old) == len(bs):
+                #   No other line moves; just replace the data in the image.
+                offset = self._offsets[i] + 4
+                self._image[offset:offset+len(bs)] = bs
+            else:
+                self._current = min(self._current, i)
+        self._text = None
+
+    def getline(self, lineno):
+        ''' Return the `bytes` tokenized data of line `lineno`.
+            A `KeyError` is raised if there is no such line.
+        '''
+        data = self.linemap[lineno]
+        if type(data) is memoryview:
+            #   Same contents, so the cached image remains valid.
+            data = self.linemap[lineno] = bytes(data)
+        return data
 
-    def lines(self):
+    def lines(self, first=None, last=None):
         ''' Return (`int`, `bytes`) tuples containing the line number
-            and its tokenized data, in line number order.
+            and its tokenized data, in line number order. If given, only
+            lines numbered `first` or more and `last` or less are returned.
         '''
-        return ( (l, self.linemap[l]) for l in sorted(self.linemap.keys()) )
+        start = 0 if first is None else bisect_left(self._index, first)
+        end = len(self._index) if last is None \
+            else bisect_right(self._index, last)
+        return ( (l, self.getline(l)) for l in self._index[start:end] )
 
     def linenos(self):
         ' Return a sequence of the line numbers, in line number order. '
-        return tuple(sorted(self.linemap.keys()))
+        return tuple(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def _update(self):
+        ''' Bring the line offsets and program image up to date,
+            regenerating the image from the first changed line onward.
+        '''
+        if self._imagetxttab != self.txttab:
+            self._imagetxttab = self.txttab
+            self._current = 0
+            self._text = None
+        i = self._current
+        if i == len(self._index):
+            return
+        del self._offsets[i:]
+        if i == 0:
+            offset = 0
+        else:
+            prevdata = self.linemap[self._index[i-1]]
+            offset = self._offsets[i-1] + 2 + 2 + len(prevdata) + 1
+        del self._image[offset:]
+
+        image = self._image
+        nextaddr = self.txttab + offset
+        for lineno in self._index[i:]:
+            linedata = self.linemap[lineno]
+            self._offsets.append(nextaddr - self.txttab)
+            nextaddr = nextaddr + 2 + 2 + len(linedata) + 1
+            image += le(nextaddr); image += le(lineno)
+            image += linedata; image.append(0)
+        self._current = len(self._index)
+
+    def lineaddr(self, lineno):
+        ''' Return the address of line `lineno` (its next-line pointer) in
+            the program image. A `KeyError` is raised if there is no such
+            line.
+        '''
+        self._update()
+        i = bisect_left(self._index, lineno)
+        if i == len(self._index) or self._index[i] != lineno:
+            raise KeyError(lineno)
+        return self.txttab + self._offsets[i]
 
     def text(self):
         ''' Return a `bytes` containing the current tokenized text.
             This does not include a leading file type byte.
+
+            The result is cached, so calling this again with no changes
+            to the lines or `txttab` is cheap.
         '''
-        nextaddr = self.txttab
-        data = []
-        for lineno, linedata in self.lines():
-            nextaddr = nextaddr + 2 + 2 + len(linedata) + 1
-            data.extend([ le(nextaddr), le(lineno), linedata, b'\x00' ])
-        data.append(le(0))
-        return b''.join(data)
+        self._update()
+        if self._text is None:
+            self._text = bytes(self._image) + le(0)
+        return self._text
 
     def write_to(self, stream):
         ''' Write the current tokenized text to `stream`,
@@ -160,6 +268,12 @@ def unle(bs):
     '''
     return struct.unpack('<H', bs[0:2])[0]
 
+def unle_from(bs, offset):
+    ''' Parse the two bytes at `offset` in _bs_ as a little-endian unsigned
+        16-bit int, without copying _bs_.
+    '''
+    return struct.unpack_from('<H', bs, offset)[0]
+
 ####################################################################
 #   BASFile
 
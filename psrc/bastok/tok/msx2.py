@@ -0,0 +1,277 @@
+''' MSX-BASIC tokenizer.
+
+    This converts text BASIC lines, such as those produced by the
+    detokenizer (`bastok.detok.msx2`) or by `bastok.blines.blines()`, to
+    tokenized lines as stored in a ``.BAS`` file. Tokenizing the
+    detokenizer's (non-expanded) output reproduces the original tokenized
+    program exactly.
+
+    Like MSX-BASIC itself, this "crunches" keywords wherever they appear
+    in program text, even within variable names (``SCORE`` is tokenized as
+    ``S``, ``C``, ``OR``, ``E``), and converts lower-case program text to
+    upper case. Numeric constants are encoded by `bastok.numeric`, and
+    those following ``GOTO``, ``THEN`` and other keywords taking line
+    numbers are encoded as line numbers.
+
+    Not yet handled: the ``?`` abbreviation for ``PRINT``, and extended
+    statements (``CALL`` and ``_``), whose names MSX-BASIC does not crunch.
+'''
+
+import  re
+
+from    bastok.charset.msx  import encode_string
+from    bastok.detok.msx2  import TOKENS
+from    bastok.numeric  import MAX_LINENO, encode_int, encode_lineno, \
+        encode_hex, encode_oct, encode_real
+from    bastok.tlines  import TLines
+
+def keyword_trie(tokens):
+    ''' Given `tokens`, a sequence of ``(bytes, keyword)`` pairs, return a
+        trie of the keywords: nested `dict`s keyed by character, with the
+        tokenized `bytes` for a keyword stored under the key `None` in the
+        node for its last character.
+    '''
+    trie = {}
+    for t, s in tokens:
+        node = trie
+        for c in s:
+            node = node.setdefault(c, {})
+        node[None] = t
+    return trie
+
+KEYWORDS = keyword_trie(TOKENS)
+
+#   Keywords after which numbers are line numbers. (`ELSE` is tokenized
+#   with a leading colon; the detokenizer handles that specially.)
+LINENO_KEYWORDS = frozenset([ 'AUTO', 'DELETE', 'ELSE', 'GOSUB', 'GOTO',
+    'LIST', 'LLIST', 'RENUM', 'RESTORE', 'RESUME', 'RETURN', 'RUN', 'THEN',
+    ])
+
+#   Convert ASCII (and only ASCII) lower case to upper case.
+ASCII_UPPER = str.maketrans('abcdefghijklmnopqrstuvwxyz',
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+LINENO      = re.compile(r'(\d+) ?')
+DIGITS      = re.compile(r'\d*')
+NUMBER      = re.compile(r'(\d*)(?:\.(\d*))?(?:([ED])([-+]?\d+))?([!#]?)')
+HEXOCT      = re.compile(r'&(?:H([0-9A-F]+)|O([0-7]+))')
+#   A DATA statement's arguments run to an unquoted colon or EOL.
+DATA_ARGS   = re.compile(r'(?:[^":]|"[^"]*(?:"|$))*')
+
+class Tokenizer:
+    ''' A tokenizer for MSX-BASIC. Instantiate this with a text line
+        and call `tokenized()` for the line number and tokenized result.
+    '''
+
+    class TokenError(ValueError):
+        ' Text that cannot be tokenized. '
+
+    def __init__(self, charset, line):
+        ''' Set up a tokenizer.
+            * `charset` is the `Charset` used to encode string constants,
+              ``DATA`` arguments and ``REM`` text. If `None`, `line` is
+              `bytes` (or a `str` of code points 0x00-0xFF) already in
+              MSX-BASIC encoding, such as ``detok --binary`` output or an
+              MSX ``SAVE "...",A`` file, and strings are passed through.
+            * `line` is the text of a BASIC line, starting with its line
+              number, without the line ending.
+        '''
+        self.charset = charset
+        self.setline(line)
+
+    def setline(self, line):
+        ' Set a new text `line` to be tokenized, clearing the output. '
+        if isinstance(line, (bytes, bytearray)):
+            line = str(line, 'ISO-8859-1')
+        self.text = line
+        self.utext = line.translate(ASCII_UPPER)
+        self.lineno = None
+        self.reset()
+
+    def tokenized(self):
+        ''' Return a tuple of the `int` line number and `bytes` tokenized
+            data (not including the line number or trailing 0x00) of the
+            line.
+        '''
+        self.parse_line()
+        return (self.lineno, b''.join(self._output))
+
+    def reset(self):
+        ' Clear the output and reset the parse position to the start. '
+        self._output = []
+        self.p = 0
+        self.linenos = False    # numbers are line numbers
+
+    def error(self, msg):
+        ' Raise a `TokenError` with `msg` and the current position. '
+        raise self.TokenError('{}: line {} col {}: {!r}'.format(
+            msg, self.lineno, self.p, self.text[self.p:self.p+12]))
+
+    ####################################################################
+    #   Parsing routines
+
+    def parse_line(self):
+        ' Tokenize the line number and then the remainder of the line. '
+        self.reset()
+        m = LINENO.match(self.text)
+        if m is None:
+            self.error('missing line number')
+        self.lineno = int(m[1])
+        if self.lineno > MAX_LINENO:
+            self.error('line number > {}'.format(MAX_LINENO))
+        self.p = m.end()
+
+        text = self.utext
+        end = len(text)
+        gen = self._output.append
+        while self.p < end:
+            c = text[self.p]
+            if c == '"':
+                self.p += 1
+                gen(b'"')
+                self.quoted()
+            elif c == ' ':
+                self.p += 1
+                gen(b' ')
+            elif '0' <= c <= '9' or (c == '.' and text[self.p+1:self.p+2]
+                    .isdigit()):
+                self.number()
+            elif c == '&' and HEXOCT.match(text, self.p):
+                self.hexoct()
+            elif self.keyword():
+                pass
+            elif 'A' <= c <= 'Z':
+                #   Not a keyword: a letter of a variable name, and any
+                #   digits following are also part of the name.
+                m = DIGITS.match(text, self.p + 1)
+                gen(bytes(text[self.p:m.end()], 'ASCII'))
+                self.p = m.end()
+                self.linenos = False
+            elif ' ' <= c <= '~':
+                self.p += 1
+                gen(bytes((ord(c),)))
+                if c != ',':
+                    self.linenos = False
+            else:
+                self.error('bad character in program text')
+
+    def keyword(self):
+        ''' If a keyword starts at the current position, consume the
+            longest one, generate its token and return `True`; otherwise
+            return `False`.
+        '''
+        text = self.utext
+        node = KEYWORDS
+        p = self.p
+        match = None
+        while p < len(text):
+            node = node.get(text[p])
+            if node is None:
+                break
+            p += 1
+            if None in node:
+                match = (p, node[None])
+        if match is None:
+            return False
+
+        kwend, t = match
+        kw = text[self.p:kwend]
+        self.p = kwend
+        self._output.append(t)
+        if kw == 'REM' or kw == "'":
+            self.string(len(text))
+        elif kw == 'DATA':
+            self.string(DATA_ARGS.match(self.text, self.p).end())
+        #   A range of line numbers, e.g. `LIST 10-20`, is also allowed.
+        self.linenos = kw in LINENO_KEYWORDS or (self.linenos and kw == '-')
+        return True
+
+    def string(self, end):
+        ''' Consume text up to position `end` and generate it encoded as
+            MSX-BASIC string text.
+        '''
+        s = self.text[self.p:end]
+        try:
+            if self.charset is None:
+                bs = bytes(s, 'ISO-8859-1')
+            else:
+                bs = encode_string(self.charset, s)
+        except UnicodeEncodeError as ex:
+            self.p += ex.start
+            self.error('character not in charset')
+        self._output.append(bs)
+        self.p = end
+
+    def quoted(self):
+        ''' Consume and generate the contents of a quoted string and its
+            closing quote, if present. The opening quote is assumed to
+            have been consumed and generated already.
+        '''
+        end = self.text.find('"', self.p)
+        if end < 0:                             # EOL ends quoted string
+            self.string(len(self.text))
+        else:
+            self.string(end)
+            self.p += 1
+            self._output.append(b'"')
+
+    def number(self):
+        ' Consume a decimal numeric constant and generate its encoding. '
+        m = NUMBER.match(self.utext, self.p)
+        self.p = m.end()
+        intpart, frac, expchar, exp, suffix = m.groups()
+        if frac is None and expchar is None and not suffix:
+            n = int(intpart)
+            if self.linenos:
+                try:
+                    self._output.append(encode_lineno(n))
+                except ValueError as ex:
+                    self.error(str(ex))
+                return
+            if n <= 32767:
+                self._output.append(encode_int(n))
+                return
+        if suffix == '#' or expchar == 'D':
+            double = True
+        elif suffix == '!':
+            double = False
+        else:
+            double = len((intpart + (frac or '')).lstrip('0')) > 6
+        try:
+            self._output.append(encode_real(intpart, frac or '',
+                int(exp or 0), double))
+        except ValueError as ex:
+            self.error(str(ex))
+        self.linenos = False
+
+    def hexoct(self):
+        ' Consume a ``&H`` or ``&O`` constant and generate its encoding. '
+        m = HEXOCT.match(self.utext, self.p)
+        try:
+            if m[1] is not None:
+                bs = encode_hex(int(m[1], 16))
+            else:
+                bs = encode_oct(int(m[2], 8))
+        except ValueError as ex:
+            self.error(str(ex))
+        self.p = m.end()
+        self._output.append(bs)
+        self.linenos = False
+
+####################################################################
+#   Programs
+
+def tokenize_program(lines, charset, *, txttab=TLines.TXTTAB_8080):
+    ''' Tokenize `lines`, an iterable of text BASIC lines (such as the
+        output of `blines()`), returning a `TLines` starting at `txttab`.
+        `charset` is as for `Tokenizer`. Blank lines are ignored; later
+        lines replace earlier lines with the same number.
+    '''
+    tl = TLines(txttab=txttab)
+    tok = Tokenizer(charset, '')
+    for line in lines:
+        if not line.strip():
+            continue
+        tok.setline(line)
+        tl.setline(*tok.tokenized())
+    return tl
@@ -0,0 +1,195 @@
+''' MSX-BASIC line number cross-reference and renumbering.
+
+    `XRef` scans the tokenized lines of a program once, finding every
+    line number reference (the targets of ``GOTO``, ``GOSUB``, ``THEN``,
+    ``ELSE``, ``RESTORE``, ``RUN`` and so on) without detokenizing it.
+    `renum()` uses an `XRef` to renumber a program as MSX-BASIC's
+    ``RENUM`` does, rewriting the references in the tokenized data.
+
+    References are stored in one of two forms:
+    - 0x0E followed by a little-endian line number. This is the form
+      in which programs are saved.
+    - 0x0D followed by a little-endian address, which MSX-BASIC
+      substitutes for line numbers when it runs a program. This is the
+      address of the 0x00 terminating the line before the target line
+      (i.e., one less than `TLines.lineaddr()` of the target) and is
+      seen only in program images taken from memory.
+'''
+
+from    bisect  import bisect_left
+from    collections  import namedtuple
+from    struct  import pack, unpack_from
+
+from    bastok.detok.msx2  import tokbytes, T_DATA, T_REM, DQUOTE, COLON
+from    bastok.tok.msx2  import LINENO_KEYWORDS
+
+T_LINENO    = 0x0E
+T_LINEADDR  = 0x0D
+
+#   Map the final byte of each keyword taking a line number (ELSE is
+#   tokenized as ``:`` followed by 0xA1) to the keyword.
+LINENO_TOKENS = { tokbytes(k)[-1]: k for k in LINENO_KEYWORDS }
+
+#   Total lengths of the tokens for constants, including the token byte.
+CONSTANT_LEN = {
+    0x0B: 3, 0x0C: 3, T_LINEADDR: 3, T_LINENO: 3,   # &O, &H, references
+    0x0F: 2, 0x1C: 3,                               # integers
+    0x1D: 5, 0x1F: 9,                               # single, double reals
+}
+
+def scan_tline(tline):
+    ''' Scan `tline`, the tokenized data of a line, and yield an
+        ``(offset, token, keyword, value)`` tuple for each line number
+        reference: the offset of its `T_LINENO` or `T_LINEADDR` `token`
+        byte, the line number `keyword` preceding it and the 16-bit
+        `value` (line number or address) following it.
+
+        Constants, strings and ``DATA`` and ``REM`` text are skipped, so
+        0x0D and 0x0E bytes within them are not mistaken for references.
+        A `ValueError` is raised if a reference is truncated by the end
+        of `tline`.
+    '''
+    keyword = None
+    p = 0
+    end = len(tline)
+    while p < end:
+        b = tline[p]
+        if b == T_LINENO or b == T_LINEADDR:
+            if p + 3 > end:
+                raise ValueError('truncated line number reference at offset {}'
+                    .format(p))
+            yield (p, b, keyword, unpack_from('<H', tline, p+1)[0])
+            p += 3
+        elif b in CONSTANT_LEN:
+            p += CONSTANT_LEN[b]
+        elif b == DQUOTE:
+            q = tline.find(DQUOTE, p+1)
+            p = end if q < 0 else q + 1
+        elif b == T_REM:                        # also `'`, `:` T_REM 0xE6
+            return
+        elif b == T_DATA:
+            p += 1
+            quoted = False
+            while p < end and (quoted or tline[p] != COLON):
+                if tline[p] == DQUOTE:
+                    quoted = not quoted
+                p += 1
+        elif b == 0xFF:                         # function token
+            p += 2
+        else:
+            if b in LINENO_TOKENS:
+                keyword = LINENO_TOKENS[b]
+            p += 1
+
+LineRef = namedtuple('LineRef', 'lineno offset token keyword target')
+LineRef.__doc__ = \
+    ''' A line number reference in line `lineno` at `offset` in its
+        tokenized data. `token` is `T_LINENO` or `T_LINEADDR`, `keyword`
+        the keyword taking the line number, and `target` the `int` line
+        number referenced. For a `T_LINEADDR` reference with an address
+        that is not that of a line, `target` is `None`.
+    '''
+
+class XRef:
+    ''' A cross-reference index of the line number references in a
+        `TLines`, built by scanning each line once.
+
+        Attributes:
+        - `refs`: A list of all `LineRef`s, in program order.
+        - `byline`: A `dict` mapping a line number to the list of
+          `LineRef`s in that line, for lines that have any.
+        - `bytarget`: A `dict` mapping a target line number to the list
+          of `LineRef`s referencing it.
+
+        The index is not updated if the `TLines` is changed. A
+        `ValueError` is raised if a line number reference is truncated
+        by the end of its line.
+    '''
+
+    def __init__(self, tlines):
+        self.tlines = tlines
+        self.refs = []
+        self.byline = {}
+        self.bytarget = {}
+        addrs = None
+        for lineno, tline in tlines.lines():
+            for offset, token, keyword, value in scan_tline(tline):
+                if token == T_LINENO:
+                    target = value
+                else:
+                    if addrs is None:
+                        addrs = { tlines.lineaddr(l) - 1: l
+                            for l in tlines.linenos() }
+                    target = addrs.get(value)
+                ref = LineRef(lineno, offset, token, keyword, target)
+                self.refs.append(ref)
+                self.byline.setdefault(lineno, []).append(ref)
+                self.bytarget.setdefault(target, []).append(ref)
+
+    def refs_to(self, lineno):
+        ' Return a list of the `LineRef`s referencing line `lineno`. '
+        return self.bytarget.get(lineno, [])
+
+    def refs_from(self, lineno):
+        ' Return a list of the `LineRef`s in line `lineno`. '
+        return self.byline.get(lineno, [])
+
+    def undefined(self):
+        ''' Return a list of the `LineRef`s whose target line is not in
+            the program, in program order.
+        '''
+        linemap = self.tlines.linemap
+        return [ r for r in self.refs if r.target not in linemap ]
+
+def renum(tlines, new=10, old=0, inc=10, *, xref=None):
+    ''' Renumber the lines of `tlines` numbered `old` or greater to start
+        at `new` in steps of `inc`, as MSX-BASIC ``RENUM new,old,inc``,
+        and update the line number references to them. `xref` is an
+        `XRef` of `tlines`, which will be built if not given.
+
+        The references are rewritten in the tokenized data at the
+        offsets found by the `XRef`; the lines are not detokenized. As
+        no line changes length, `T_LINEADDR` references remain valid and
+        are left as they are.
+
+        References to lines not in the program are left unchanged and
+        returned as a list of `LineRef`s, with `lineno` the new number
+        of the line containing them; MSX-BASIC prints these as
+        ``Undefined line nnn in mmm``. A `ValueError` is raised, and
+        `tlines` is not changed, if `inc` is not positive, if the new
+        numbers would not follow the lines before `old` or if they
+        would exceed `tlines.maxlin`, or if building the `XRef` finds a
+        truncated line number reference.
+    '''
+    if inc <= 0:
+        raise ValueError('increment {} not positive'.format(inc))
+    linenos = tlines.linenos()
+    first = bisect_left(linenos, old)
+    if first > 0 and new <= linenos[first-1]:
+        raise ValueError('new line number {} not after line {}'
+            .format(new, linenos[first-1]))
+    count = len(linenos) - first
+    if count and new + (count - 1) * inc > tlines.maxlin:
+        raise ValueError('line number {} out of range 0-{}'
+            .format(new + (count - 1) * inc, tlines.maxlin))
+
+    if xref is None:
+        xref = XRef(tlines)
+    newnos = dict(zip(linenos[first:], range(new, tlines.maxlin + 1, inc)))
+    lines = []
+    for lineno, tline in tlines.lines():
+        refs = xref.refs_from(lineno)
+        if any( r.token == T_LINENO and r.target in newnos for r in refs ):
+            tline = bytearray(tline)
+            for r in refs:
+                if r.token == T_LINENO and r.target in newnos:
+                    tline[r.offset+1:r.offset+3] = pack('<H', newnos[r.target])
+            tline = bytes(tline)
+        lines.append((newnos.get(lineno, lineno), tline))
+
+    undefined = [ r._replace(lineno=newnos.get(r.lineno, r.lineno))
+        for r in xref.undefined() ]
+    tlines.clearlines()
+    for lineno, tline in lines:
+        tlines.setline(lineno, tline)
+    return undefined
@@ -1,3 +1,10 @@
+from    bisect  import bisect_left
+from    collections  import Counter, namedtuple
+from    itertools  import chain, groupby
+import  math
+
+from    cmtconv.audio  import PulseDecoder
+
 def baud_rates(baud):
     res = []
     b = baud
@@ -10,3 +17,216 @@ def baud_rates(baud):
         res.append(int(b))
         b = b * 2
     return res
+
+def baud_width_range(baud, tol):
+    ''' Return the (low, high) range of pulse widths, in seconds, that are
+        considered to be of `baud` with tolerance `tol`.
+    '''
+    return ((1.0 + math.log(1.0 - tol)) * 0.5/baud,
+            (1.0 + math.log(1.0 + tol)) * 0.5/baud)
+
+class BaudHistogram:
+    ''' A histogram of pulse widths binned by baud rate.
+
+        Each of `bauds` has a bin covering the pulse widths given by
+        `baud_width_range()`. Where the ranges of two bauds overlap, the
+        pulse is counted for the higher baud. Pulses narrower than all
+        bins are counted in the ``'low'`` bin, wider than all bins in the
+        ``'high'`` bin, and between bins in the ``'unknown'`` bin.
+
+        Pulses may be added in any number of calls to `add()`; only the
+        count, mean and sum of squared differences from the mean (using
+        Welford's algorithm) are kept for each bin, not the pulses
+        themselves, so any length of capture can be processed in
+        constant memory.
+    '''
+
+    SPECIAL = ('low', 'high', 'unknown')
+
+    def __init__(self, bauds, tol):
+        #   Bins in order of increasing pulse width.
+        self.bauds = sorted(set(bauds), reverse=True)
+        ranges = [ baud_width_range(b, tol) for b in self.bauds ]
+        self._lows  = [ l for l, _ in ranges ]
+        self._highs = [ h for _, h in ranges ]
+        n = len(self.bauds)
+        self.LOW, self.HIGH, self.UNKNOWN = n, n + 1, n + 2
+        #   Per-bin count, mean and sum of squares of differences from mean.
+        self._count = [0] * (n + 3)
+        self._mean  = [0.0] * (n + 3)
+        self._m2    = [0.0] * (n + 3)
+
+    def bin(self, width):
+        ''' Return the index of the bin for pulse `width`. '''
+        #   The first bin whose high edge is at or above `width` is the
+        #   only candidate, since the edges increase with the bin index.
+        i = bisect_left(self._highs, width)
+        if i == len(self._highs):   return self.HIGH
+        if width >= self._lows[i]:  return i
+        if width < self._lows[0]:   return self.LOW
+        return self.UNKNOWN
+
+    def add(self, pulses):
+        ''' Add the widths of `pulses`, an iterable of ``(time, level,
+            width)`` tuples, to the histogram.
+        '''
+        #   Local names for speed in this loop, which may run many
+        #   millions of times.
+        bin, count, mean, m2 = self.bin, self._count, self._mean, self._m2
+        for (_, _, w) in pulses:
+            i = bin(w)
+            count[i] += 1
+            d = w - mean[i]
+            mean[i] += d / count[i]
+            m2[i] += d * (w - mean[i])
+
+    def stats(self, i):
+        ''' Return (count, mean, stdev) of bin `i`; mean or stdev is `None`
+            if there are too few pulses in the bin.
+        '''
+        c = self._count[i]
+        if c == 0:  return (c, None, None)
+        if c == 1:  return (c, self._mean[i], None)
+        return (c, self._mean[i], math.sqrt(self._m2[i] / (c - 1)))
+
+    def rows(self):
+        ''' Return a list of `(baud, count, mean, stdev)` for the ``'low'``
+            bin, each baud in increasing order, and the ``'high'`` and
+            ``'unknown'`` bins.
+        '''
+        order = chain((self.LOW,), reversed(range(len(self.bauds))),
+            (self.HIGH, self.UNKNOWN))
+        labels = self.bauds + list(self.SPECIAL)
+        return [ (labels[i],) + self.stats(i) for i in order ]
+
+def width_clusters(widths, n=2, resolution=0.03, separation=1.4):
+    ''' Return the centres of the `n` most common clusters of pulse
+        `widths`, in order of increasing width.
+
+        Widths are binned on a logarithmic scale with bins `resolution`
+        (as a fraction) wide; the peaks are the most populated bins that
+        are at least a factor of `separation` apart. Each centre is then
+        the mean of the widths within half that factor of its peak, so it
+        reflects the actual speed of the tape rather than a nominal baud.
+    '''
+    scale = 1.0 / math.log(1.0 + resolution)
+    hist = Counter( int(math.log(w) * scale) for w in widths if w > 0 )
+    #   Smooth over adjacent bins so a peak split across bins still wins.
+    smoothed = { b: hist[b-1] + hist[b] + hist[b+1] for b in hist }
+    mindist = math.log(separation) * scale
+    peaks = []
+    for b in sorted(smoothed, key=lambda b: (-smoothed[b], b)):
+        if all( abs(b - p) >= mindist for p in peaks ):
+            peaks.append(b)
+            if len(peaks) == n:
+                break
+    half = math.sqrt(separation)
+    centres = []
+    for p in sorted(peaks):
+        centre = math.exp((p + 0.5) / scale)
+        ws = [ w for w in widths if centre / half <= w <= centre * half ]
+        centres.append(sum(ws) / len(ws))
+    return centres
+
+def pulses_per_symbol(symbols, symbol, maxpulses=16, threshold=0.9):
+    ''' Given `symbols`, a sequence of pulse classifications, return the
+        largest number of pulses (up to `maxpulses`) of which at least
+        `threshold` of the runs of `symbol` are a multiple. Since every
+        bit is made of the same number of pulses, that is the number of
+        pulses per bit.
+    '''
+    runs = [ len(list(g)) for (s, g) in groupby(symbols) if s == symbol ]
+    if not runs:
+        return 1
+    for n in range(maxpulses, 1, -1):
+        if sum( 1 for r in runs if r % n == 0 ) >= threshold * len(runs):
+            return n
+    return 1
+
+Framing = namedtuple('Framing', 'mark_baud mark_pulses space_baud space_pulses'
+    ' start stop coverage')
+Framing.__doc__ = \
+    ''' Tape encoding parameters found by `detect_framing()`. `start` and
+        `stop` are strings of ``m`` and ``s`` for mark and space bits, as
+        used by ``analyze-cmt``. `coverage` is the fraction of the pulses
+        examined that were decoded as bytes.
+    '''
+
+def framing_decoder(framing, invert=False, lsb_first=False, tol=0.25):
+    ' Return a `PulseDecoder` for `framing`. '
+    bits = lambda s: tuple( 1 if c == 'm' else 0 for c in s )
+    return PulseDecoder(framing.mark_baud, framing.mark_pulses,
+        framing.space_baud, framing.space_pulses, invert, lsb_first,
+        bits(framing.start), bits(framing.stop), (tol, tol), (tol, tol))
+
+def framing_args(framing):
+    ' Return the ``analyze-cmt`` arguments to select `framing`. '
+    return '-m {} --mark-pulses {} -s {} --space-pulses {}' \
+        ' --start {} --stop {}'.format(framing.mark_baud,
+            framing.mark_pulses, framing.space_baud, framing.space_pulses,
+            framing.start, framing.stop)
+
+def byte_coverage(pd, pulses):
+    ''' Return the number of `pulses` that `PulseDecoder` `pd` decodes as
+        bytes, reading consecutive bytes from each point at which it can
+        find a byte.
+    '''
+    covered = 0
+    i = 0
+    while True:
+        r = pd.find_next_byte_alignment(pulses, i)
+        if r is None:
+            return covered
+        (i0, i, _) = r
+        covered += i - i0
+        while True:
+            r = pd.try_read_byte(pulses, i)
+            if r is None:
+                break
+            covered += r[0] - i
+            i = r[0]
+        i += 1
+
+def detect_framing(pulses, tol=0.25, maxstop=3, limit=100000):
+    ''' Guess the encoding of `pulses` and return a `Framing`, or `None` if
+        there are not two distinct pulse widths.
+
+        The mark and space bauds are found from the two most common pulse
+        widths (see `width_clusters()`) and the pulses per bit from the
+        run lengths of each (see `pulses_per_symbol()`). Each framing of
+        a start bit and 1 to `maxstop` stop bits of the opposite symbol
+        is then tried on up to `limit` pulses, and the one that decodes
+        the most pulses as bytes is returned.
+
+        Bit order and sense do not affect the framing and are not
+        detected.
+    '''
+    pulses = pulses[:limit]
+    widths = [ p[2] for p in pulses ]
+    centres = width_clusters(widths)
+    if len(centres) < 2:
+        return None
+    (mark_width, space_width) = centres
+    mark_baud = int(round(0.5 / mark_width))
+    space_baud = int(round(0.5 / space_width))
+
+    def classify(w):
+        if mark_width * (1 - tol) <= w <= mark_width * (1 + tol):
+            return 'm'
+        if space_width * (1 - tol) <= w <= space_width * (1 + tol):
+            return 's'
+        return None
+    symbols = [ classify(w) for w in widths ]
+    mark_pulses = pulses_per_symbol(symbols, 'm')
+    space_pulses = pulses_per_symbol(symbols, 's')
+
+    best = None
+    for start in 'sm':
+        other = 'm' if start == 's' else 's'
+        for nstop in range(1, maxstop + 1):
+            f = Framing(mark_baud, mark_pulses, space_baud, space_pulses,
+                start, other * nstop, 0.0)
+            coverage = byte_coverage(framing_decoder(f, tol=tol), pulses)
+            if best is None or coverage > best.coverage:
+                best = f._replace(coverage=coverage)
+    return best._replace(coverage=best.coverage / len(pulses))
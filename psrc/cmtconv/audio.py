@@ -1,17 +1,30 @@
 ''' Library to read/write Kansas City format tape audio
 '''
 
+from    array  import array
 from    enum  import Enum
 from    itertools  import chain
 from    collections  import namedtuple
 from    enum  import IntEnum
 import  math
+import  sys
 
 from    binary.memimage  import MemImage
 from    cmtconv.logging  import *
 
 class ReadError(Exception):
-    pass
+    ''' An error decoding tape data.
+
+        If more than one argument is given, the first is a ``%`` format
+        string for the remainder. The message is formatted only when the
+        exception is converted to a string, so code that catches and
+        discards `ReadError` (e.g., while searching for data) does not pay
+        the cost of formatting it.
+    '''
+    def __str__(self):
+        if len(self.args) > 1:
+            return self.args[0] % self.args[1:]
+        return super().__str__()
 
 
 # General approach is to use layered abstractions in
@@ -68,11 +81,14 @@ def stats(samples):
         return (mean, math.sqrt(ss / n))
 
 
-# samples   : [ float ]
+# samples     : [ float ]
+# sample_dur  : float
+# grad_factor : float
+# start_time  : float   -- time of samples[0], added to pulse times
 # ->
-# pulses    : ( (float, int, float) )
-#
-def samples_to_pulses_via_edge_detection(samples, sample_dur, grad_factor=0.5):
+# pulses      : ( (float, int, float) )
+def samples_to_pulses_via_edge_detection(samples, sample_dur, grad_factor=0.5,
+        start_time=0.0):
     res=[]
     n = len(samples)
     if n > 1:
@@ -108,8 +124,8 @@ def samples_to_pulses_via_edge_detection(samples, sample_dur, grad_factor=0.5):
                     d = samples[i] - samples[i-1]
                 # mark mid point
                 idx = int((i+i0)/2)
-                t0=sample_dur*prev
-                t1=sample_dur*idx
+                t0=start_time + sample_dur*prev
+                t1=start_time + sample_dur*idx
                 # Use mid-point of pulse to get level
                 mid = int((prev+idx)/2)
                 if samples[mid] > sample_mean + 0.5 * sample_stdev:
@@ -129,8 +145,8 @@ def samples_to_pulses_via_edge_detection(samples, sample_dur, grad_factor=0.5):
             lvl=-1
         else:
             lvl=0
-        t0=sample_dur*prev
-        t1=sample_dur*n
+        t0=start_time + sample_dur*prev
+        t1=start_time + sample_dur*n
         res.append((t1,lvl,t1-t0))
         v2("edge detection: done, found {} edges".format(len(res)))
         v2( "first pulses: {}" .format(list(res[:10])))
@@ -323,43 +339,54 @@ class PulseDecoder:
         return (i, i - i_next)
 
 
+    # Return the offset from `i_next` of the first of `n` pulses that is
+    # not a mark (or is past the end of `pulses`), or `None` if all are.
+    #
+    # Biased towrards marks - we accept a wider range of pulse widths
+    def _bad_mark(self, pulses, i_next, n):
+        return self._bad_width(pulses, i_next, n,
+            self.mark_lower * .75, self.mark_upper * 1.5)
+
+    # As `_bad_mark()`, for spaces.
+    #
+    # Biased towrards spaces - we accept a wider range of pulse widths
+    def _bad_space(self, pulses, i_next, n):
+        return self._bad_width(pulses, i_next, n,
+            self.space_lower * .75, self.space_upper * 1.35)
+
+    def _bad_width(self, pulses, i_next, n, lower, upper):
+        checked = pulses[i_next:i_next + n]
+        for (i, (_, _, dur)) in enumerate(checked):
+            if dur < lower or dur > upper:
+                return i
+        return None if len(checked) == n else len(checked)
+
+    def _expect_error(self, kind, pulses, i_next, n, i):
+        idx = i_next + i
+        if idx >= len(pulses):
+            return ReadError('Out of pulses at %d, on pulse %d of expected'
+                ' %d %s pulses', idx, i, n, kind)
+        return ReadError('Expected %d %s pulses at %d (%f)'
+            ', failed on pulse %d with pulse width %f'
+            ', pulses = %s',
+            n, kind, i_next, pulses[i_next][0], i, pulses[idx][2],
+            pulses[i_next:i_next + n])
+
     #
     # Expect marks
     #
-    # Biased towrards marks - we accept a wider range of pulse widths
     def expect_marks(self, pulses, i_next, n):
-        for i in range(0, n):
-            idx = i_next + i
-            if idx >= len(pulses):
-                raise ReadError('Out of pulses at %d, on pulse %d of expected'
-                    ' %d mark pulses'
-                    % (idx, i, n))
-            dur = pulses[idx][2]
-            if dur < self.mark_lower * .75 or dur > self.mark_upper * 1.5:
-                raise ReadError('Expected %d mark pulses at %d (%f)'
-                    ', failed on pulse %d with pulse width %f'
-                    ', pulses = %s'
-                        % (n, i_next, pulses[i_next][0], i, dur,
-                            repr(pulses[i_next:i_next + n])))
+        i = self._bad_mark(pulses, i_next, n)
+        if i is not None:
+            raise self._expect_error('mark', pulses, i_next, n, i)
         return i_next + n
     #
     # Expect spaces
     #
-    # Biased towrards spaces - we accept a wider range of pulse widths
     def expect_spaces(self, pulses, i_next, n):
-        for i in range(n):
-            idx = i_next + i
-            if idx >= len(pulses):
-                raise ReadError('Out of pulses at %d, on pulse %d of expected'
-                    ' %d space pulses'
-                    % (idx, i, n))
-            dur = pulses[idx][2]
-            if dur < self.space_lower * .75 or dur > self.space_upper * 1.35:
-                raise ReadError('Expected %d space pulses at %d (%f)'
-                    ', failed on pulse %d with pulse width %f'
-                    ', pulses = %s'
-                        % (n, i_next, pulses[i_next][0], i, dur,
-                            repr(pulses[i_next:i_next + n])))
+        i = self._bad_space(pulses, i_next, n)
+        if i is not None:
+            raise self._expect_error('space', pulses, i_next, n, i)
         return i_next + n
 
     # read one bit represented by a mark/space symbol
@@ -382,8 +409,7 @@ class PulseDecoder:
             return (self.expect_spaces(pulses, i_next, self.space_pulses), 0)
         else:
             raise ReadError('Unexpected pulse width at: %f, '
-                'with pulse width: %f'
-                % (pulses[i_next][0], pulses[i_next][2]))
+                'with pulse width: %f', pulses[i_next][0], pulses[i_next][2])
 
     # pulses    : ( ( float, int, float ), )
     # idx       : int
@@ -409,10 +435,8 @@ class PulseDecoder:
         if bits == self.start_bits:
             return i_next
         else:
-            raise ReadError(
-                'Expected start bits: {}, got: {} at {} ({:6.9f})'.format(
-                    str(self.start_bits), str(bits), start, pulses[start][0])
-                )
+            raise ReadError('Expected start bits: %s, got: %s at %d (%6.9f)',
+                self.start_bits, bits, start, pulses[start][0])
 
     # pulses    : ( ( float, int, float ), )
     # i_next    : int
@@ -424,8 +448,8 @@ class PulseDecoder:
         if bits == self.stop_bits:
             return i_next
         else:
-            raise ReadError('Expected stop bits: %s, got: %s ' %
-                            (str(self.stop_bits), str(bits)))
+            raise ReadError('Expected stop bits: %s, got: %s ',
+                self.stop_bits, bits)
 
     # pulses    : ( ( float, int, float ), )
     # i_next    : int
@@ -434,6 +458,9 @@ class PulseDecoder:
     def read_raw_byte(self, pulses, i_next):
         (i_next, bits) = self.read_bits(pulses, i_next, 8)
         #v4('read_raw_byte:', bits) # XXX very slow
+        return (i_next, self._bits_to_byte(bits))
+
+    def _bits_to_byte(self, bits):
         res = 0
         if self.invert_sense:
             for i in range(8):
@@ -441,7 +468,7 @@ class PulseDecoder:
         else:
             for i in range(8):
                 res |= self.mask_sequence[i] if bits[i] else 0
-        return (i_next, res)
+        return res
 
     # pulses    : ( ( float, int, float ), )
     # i_next    : int
@@ -468,6 +495,91 @@ class PulseDecoder:
             res.append(x)
         return (i_next, res)
 
+    #   Non-raising scanning API
+    #
+    #   These are equivalent to the read_ methods above, but return `None`
+    #   instead of raising `ReadError` (or `IndexError` at the end of
+    #   `pulses`). They are for code that searches for data by trying to
+    #   read at many positions, most of which are expected to fail.
+
+    # pulses    : ( ( float, int, float ), )
+    # idx       : int
+    # ->
+    # ( i_next, bit ) or None
+    def try_read_bit(self, pulses, idx):
+        if idx >= len(pulses):
+            return None
+        dur = pulses[idx][2]
+        if dur >= self.mark_lower and dur <= self.mark_upper:
+            if self._bad_mark(pulses, idx, self.mark_pulses) is None:
+                return (idx + self.mark_pulses, 1)
+        elif dur >= self.space_lower and dur <= self.space_upper:
+            if self._bad_space(pulses, idx, self.space_pulses) is None:
+                return (idx + self.space_pulses, 0)
+        return None
+
+    # pulses    : ( ( float, int, float ), )
+    # idx       : int
+    # n         : int
+    # ->
+    # ( i_next, bits ) or None
+    def try_read_bits(self, pulses, idx, n):
+        bits = []
+        for _ in range(n):
+            r = self.try_read_bit(pulses, idx)
+            if r is None:
+                return None
+            (idx, bit) = r
+            bits.append(bit)
+        return (idx, tuple(bits))
+
+    # pulses    : ( ( float, int, float ), )
+    # idx       : int
+    # ->
+    # ( i_next, byte ) or None
+    def try_read_byte(self, pulses, idx):
+        #   The first pulse determines the value of the first start bit,
+        #   so a wrong one can be rejected without reading a whole bit.
+        if self.start_bits and idx < len(pulses):
+            dur = pulses[idx][2]
+            if dur >= self.mark_lower and dur <= self.mark_upper:
+                bit = 1
+            elif dur >= self.space_lower and dur <= self.space_upper:
+                bit = 0
+            else:
+                return None
+            if bit != self.start_bits[0]:
+                return None
+        r = self.try_read_bits(pulses, idx, len(self.start_bits))
+        if r is None or r[1] != self.start_bits:
+            return None
+        r = self.try_read_bits(pulses, r[0], 8)
+        if r is None:
+            return None
+        (idx, bits) = r
+        r = self.try_read_bits(pulses, idx, len(self.stop_bits))
+        if r is None or r[1] != self.stop_bits:
+            return None
+        return (r[0], self._bits_to_byte(bits))
+
+    # Find the first pulse index at or after `idx` (and before `end`, if
+    # given) from which a complete byte, including start and stop bits,
+    # can be read.
+    #
+    # pulses    : ( ( float, int, float ), )
+    # idx       : int
+    # end       : int
+    # ->
+    # ( i, i_next, byte ) or None
+    def find_next_byte_alignment(self, pulses, idx, end=None):
+        if end is None or end > len(pulses):
+            end = len(pulses)
+        for i in range(idx, end):
+            r = self.try_read_byte(pulses, i)
+            if r is not None:
+                return (i,) + r
+        return None
+
 # Encoder class
 class Encoder(object):
     # mark_baud     : int   -- mark baud rate
@@ -625,3 +737,83 @@ def pulses_to_samples2(chunks, sample_dur, low, mid, high):
         else:
             raise Exception('Unknown audio marker')
     return res
+
+
+# Convert pulses to runs of samples at a given level
+#
+# chunks     : tuple of (SILENCE, duration) or (SOUND, pulse_widths)
+# sample_dur : float
+# ->
+# runs       : [ (int, int) ]   -- (level -1/0/1, number of samples)
+#
+# This uses the same levels and rounding as `pulses_to_samples2()`.
+def pulses_to_runs(chunks, sample_dur):
+    res = []
+    lvl = 0
+    for chunk in chunks:
+        if chunk[0] == AudioMarker.SILENCE:
+            res.append((0, int(0.5 + chunk[1]/sample_dur)))
+            lvl = 0
+        elif chunk[0] == AudioMarker.SOUND:
+            for d in chunk[1]:
+                if type(d) is tuple:
+                    # tuple is width, level
+                    (w, lvl_) = d
+                else:
+                    w = d
+                    lvl_ = 1 if lvl == 0 else -lvl
+                res.append((lvl_, int(0.5 + w/sample_dur)))
+                lvl = lvl_
+            res.append((0, 1))
+        else:
+            raise Exception('Unknown audio marker')
+    return res
+
+def pcm_frames(sampwidth, channels, amplitude=1.0):
+    ''' Return a tuple of the `bytes` of a single WAV PCM frame of
+        `channels` samples of `sampwidth` bytes each, for each of the low,
+        mid and high levels. `amplitude` is the fraction of full scale
+        used for the low and high levels.
+
+        As per the WAV format, 8-bit samples are unsigned and wider
+        samples are signed little-endian.
+    '''
+    if amplitude < 0.0 or amplitude > 1.0:
+        raise ValueError('amplitude {} not in range 0-1'.format(amplitude))
+    amp = int(amplitude * (2 ** (8 * sampwidth - 1) - 1))
+    if sampwidth == 1:
+        mid = 0x80
+        sample = lambda v: bytes([v])
+    else:
+        mid = 0
+        sample = lambda v: v.to_bytes(sampwidth, 'little', signed=True)
+    return tuple( sample(v) * channels for v in (mid - amp, mid, mid + amp) )
+
+def pulses_to_pcm(chunks, rate, sampwidth=1, channels=1, amplitude=1.0):
+    ''' Render `chunks` as in `pulses_to_samples2()` and return the
+        WAV PCM frame data as `bytes`. See `pcm_frames()` for the
+        meaning of the parameters.
+
+        Each run of samples at the same level is produced by a single
+        `bytes` repetition, so no Python code runs per sample.
+    '''
+    frames = pcm_frames(sampwidth, channels, amplitude)
+    return b''.join( frames[lvl+1] * n
+        for (lvl, n) in pulses_to_runs(chunks, 1.0 / rate) )
+
+def pcm_samples(frames, sampwidth, channels):
+    ''' Return a sequence of the `int` sample values of the first channel
+        of WAV PCM data `frames`. 8-bit samples are unsigned (0-255) and
+        16-bit samples are signed.
+    '''
+    if sampwidth == 1:
+        samples = frames
+    elif sampwidth == 2:
+        samples = array('h', frames)
+        if sys.byteorder == 'big':
+            samples.byteswap()
+    else:
+        raise ValueError('Only 8- and 16-bit samples are supported')
+    if channels > 1:
+        samples = samples[::channels]
+    return samples
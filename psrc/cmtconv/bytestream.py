@@ -18,7 +18,8 @@ import  wave
 
 from    cmtconv.audio  import samples_to_pulses, pulses_to_samples, \
     filter_clicks, samples_to_pulses_via_edge_detection, \
-    pulses_to_samples2
+    pulses_to_pcm, pcm_samples
+import  cmtconv.csw as csw
 from    cmtconv.logging  import *
 from    binary.tool  import asl
 
@@ -43,6 +44,17 @@ def read_block_bytestream(platform, stream):
     bm = get_block_module(platform)
     return bm.read_block_bytestream(stream)
 
+def read_block_bytestreams(platform, stream):
+    ''' Read bytes from `stream`, which may contain many files stored
+        back to back (as in a `.cas` archive), and generate a sequence
+        of the block objects for each file in turn.
+
+        Files are parsed only as they are requested from the generator,
+        so memory use does not grow with the size of `stream`.
+    '''
+    bm = get_block_module(platform)
+    return bm.read_block_bytestreams(stream)
+
 def native_filename(filename):
     ''' Ensure `filename` is a `bytes` to be interpreted in the
         platform-specific character set/encoding.
@@ -88,15 +100,51 @@ def blocks_from_obj(platform, stream, filename=None):
             filename=filename)
 
 
-def blocks_from_audio(platform, stream):
-    '''Convert from audio to a sequence of blocks'''
-    bm = get_block_module(platform)
+def wav_position(pos, rate):
+    ''' Return the sample number in a WAV file of `rate` samples per second
+        for `pos`, which is either a time in seconds (a number or `str`)
+        or a `str` ``@N`` giving sample number `N` directly.
+    '''
+    if isinstance(pos, str):
+        if pos.startswith('@'):
+            return int(pos[1:], 0)
+        pos = float(pos)
+    return int(pos * rate)
+
+def read_wav(stream, start=None, end=None):
+    ''' Read the samples of the first channel of the WAV file `stream`
+        from position `start` up to position `end` (see `wav_position()`),
+        the start or end of the file if `None`. Only that part of the
+        file is read.
+
+        Returns a tuple of the samples, the sample rate and the time in
+        seconds of the first sample returned.
+    '''
     w = wave.open(stream, 'rb')
-    if w.getnchannels() != 1 or w.getsampwidth() != 1:
-        raise ValueError('Only mono 8-bit wav files are supported')
+    if w.getsampwidth() not in (1, 2):
+        raise ValueError('Only 8- and 16-bit wav files are supported')
     rate = w.getframerate()
-    n_samples = w.getnframes()
-    samples = w.readframes(n_samples)
+    nframes = w.getnframes()
+    first = 0 if start is None else wav_position(start, rate)
+    last = nframes if end is None else wav_position(end, rate)
+    first = max(0, min(first, nframes)); last = max(first, min(last, nframes))
+    if first > 0:
+        w.setpos(first)
+    #   Only the first channel of a multi-channel file is used.
+    samples = pcm_samples(w.readframes(last - first),
+        w.getsampwidth(), w.getnchannels())
+    v2('Window: samples {}-{} of {}', first, last, nframes)
+    return (samples, rate, first / rate)
+
+def blocks_from_audio(platform, stream, start=None, end=None):
+    ''' Convert from audio to a sequence of blocks. If `start` or `end`
+        are given, only that part of the audio is read; see `read_wav()`.
+    '''
+    bm = get_block_module(platform)
+    (samples, rate, start_time) = read_wav(stream, start, end)
+    n_samples = len(samples)
+    if n_samples == 0:
+        raise ValueError('No samples in wav file or window')
     sample_dur = 1.0 / rate
     v2('Rate: %d' % rate)
     v2('Duration: %f' % (sample_dur * n_samples))
@@ -107,7 +155,8 @@ def blocks_from_audio(platform, stream):
     # pulses = samples_to_pulses(samples, sample_dur)
     params = bm.parameters()
     gf = params.get("edge_gradient_factor", 0.5)
-    pulses = samples_to_pulses_via_edge_detection(samples, sample_dur, gf)
+    pulses = samples_to_pulses_via_edge_detection(samples, sample_dur, gf,
+        start_time)
     pulses = filter_clicks(pulses, sample_dur)
     v2('Number of pulses: %d ' % len(pulses))
     pulse_widths = [dur for (_,_,dur) in pulses]
@@ -117,6 +166,19 @@ def blocks_from_audio(platform, stream):
     (_,blocks) = fr.read_file(pulses, 0)
     return blocks
 
+def blocks_from_csw(platform, stream):
+    ''' Read a CSW file and return a sequence of blocks. The pulses are
+        passed directly to the platform's `FileReader`; no edge detection
+        is needed.
+    '''
+    bm = get_block_module(platform)
+    (rate, polarity, counts) = csw.read_csw(stream)
+    pulses = csw.counts_to_pulses(counts, rate, polarity)
+    v2('Number of pulses: %d ' % len(pulses))
+    fr = bm.FileReader()
+    (_,blocks) = fr.read_file(pulses, 0)
+    return blocks
+
 ####################################################################
 #   blocks → bytestream
 
@@ -126,7 +188,20 @@ def write_block_bytestream(platform, blocks, stream):
     if 'write_block_bytestream' in dir(bm):
         return bm.write_block_bytestream(blocks, stream)
     else:
-        stream.write(get_block_bytestream(blocks))
+        for b in blocks:
+            stream.write(b.to_bytes())
+
+def write_block_bytestreams(platform, files, stream):
+    ''' Append to `stream` the bytes of each file in `files`, an iterable
+        of block sequences such as that generated by
+        `read_block_bytestreams()`, as they would be recorded on tape.
+
+        Each file is written as soon as it is taken from `files`, so
+        a generator may be used to write any number of files in
+        constant memory.
+    '''
+    for blocks in files:
+        write_block_bytestream(platform, blocks, stream)
 
 def get_block_bytestream(blocks):
     ''' Return a `bytes` containing the contents of the blocks as they
@@ -148,24 +223,42 @@ def get_file_bytestream(blocks):
     return bytes(chain(*( b.filedata for b in blocks )))
 
 
-def blocks_to_audio(platform, blocks, stream):
-    '''Write out the blocks as audio'''
+#   Sample bit depths supported by `blocks_to_audio()`.
+AUDIO_BITS = (8, 16)
+
+def blocks_to_audio(platform, blocks, stream,
+        rate=44100, bits=8, channels=1, amplitude=1.0):
+    ''' Write out the blocks as a WAV file of `rate` samples per second
+        with `bits` (8 or 16) bits per sample. The same signal is written
+        to each of `channels` channels at `amplitude` (0.0-1.0) of full
+        scale.
+    '''
+    if bits not in AUDIO_BITS:
+        raise ValueError('Only 8- and 16-bit wav files are supported')
+    if channels < 1:
+        raise ValueError('Bad channel count {}'.format(channels))
     bm = get_block_module(platform)
     # Convert File to pulses
     pulses = bm.FileEncoder().encode_file(blocks)
 
     # Convert pulses to samples
-    rate        = 44100
-    sample_dur  = 1.0 / rate
-    amp         = 127
-    mid         = 128
-    #samples     = pulses_to_samples(pulses, sample_dur, mid, mid-amp, mid+amp)
-    samples     = pulses_to_samples2(pulses, sample_dur, mid-amp, mid, mid+amp)
+    frames = pulses_to_pcm(pulses, rate, bits // 8, channels, amplitude)
 
     # Write out WAV file
     w = wave.open(stream,'wb')
-    w.setnchannels(1)
-    w.setsampwidth(1)
+    w.setnchannels(channels)
+    w.setsampwidth(bits // 8)
     w.setframerate(rate)
-    w.writeframes(bytes(samples))
+    w.writeframes(frames)
+
+def blocks_to_csw(platform, blocks, stream, rate=44100, compress=True):
+    ''' Write out the blocks as a CSW v2 file of `rate` samples per
+        second, Z-RLE compressed if `compress` is true. The pulses from
+        the platform's `FileEncoder` are written directly, without
+        rendering samples.
+    '''
+    bm = get_block_module(platform)
+    pulses = bm.FileEncoder().encode_file(blocks)
+    csw.write_csw(stream, csw.chunks_to_counts(pulses, rate), rate,
+        compress=compress)
 
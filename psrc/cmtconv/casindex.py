@@ -0,0 +1,141 @@
+''' Random-access index of the files in a multi-file `.cas` archive.
+
+    An archive is scanned once to record the offset, length, filename,
+    file type and block range of every file in it; only the block headers
+    are read, not the block data. The index is saved in a "sidecar" file
+    next to the archive (see `sidecar_path()`) so that later runs can list
+    the archive or extract a single file by seeking directly to it.
+
+    The sidecar records the size and modification time of the archive; if
+    either has changed the sidecar is considered stale and the archive is
+    rescanned.
+'''
+
+from    collections  import namedtuple
+import  json
+import  mmap
+import  os
+
+from    cmtconv.logging  import *
+from    cmtconv.bytestream  import get_block_module, read_block_bytestream
+
+IndexEntry = namedtuple('IndexEntry', 'offset length filename filetype blocks')
+IndexEntry.__doc__ = \
+    ''' A file in a `.cas` archive.
+
+        - `offset`, `length`: location of the file's blocks in the archive.
+        - `filename`: `str` decoded from the native filename as ISO-8859-1.
+        - `filetype`: name of the platform-specific file type.
+        - `blocks`: ``(first, end)`` range of the file's block numbers
+          within the whole archive, counting from 0.
+    '''
+
+#   Version of the sidecar file format.
+SIDECAR_VERSION = 1
+
+def scan_index(platform, buf):
+    ''' Scan `buf`, a bytes-like object (such as an `mmap`) containing
+        a `.cas` archive for `platform`, and return a list of
+        `IndexEntry` for the files in it.
+    '''
+    bm = get_block_module(platform)
+    entries = []
+    offset = 0
+    blockno = 0
+    while offset < len(buf):
+        (nextoffset, filename, filetype, nblocks) \
+            = bm.scan_block_bytestream(buf, offset)
+        entries.append(IndexEntry(offset, nextoffset - offset,
+            filename.decode('ISO-8859-1'), filetype,
+            (blockno, blockno + nblocks)))
+        v2('indexed {}', entries[-1])
+        offset = nextoffset
+        blockno += nblocks
+    return entries
+
+def build_index(platform, path):
+    ''' Scan the `.cas` archive at `path` with `mmap` and return a list of
+        `IndexEntry` for the files in it.
+    '''
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return scan_index(platform, buf)
+
+def sidecar_path(path):
+    ' Return the path of the index sidecar file for the archive at `path`. '
+    return str(path) + '.idx'
+
+def _archive_stamp(path):
+    st = os.stat(path)
+    return { 'size': st.st_size, 'mtime_ns': st.st_mtime_ns }
+
+def write_index(platform, path, entries):
+    ''' Write `entries`, the index of the archive at `path`, to its
+        sidecar file.
+    '''
+    sidecar = {
+        'version':  SIDECAR_VERSION,
+        'platform': platform,
+        'archive':  _archive_stamp(path),
+        'files':    [ e._asdict() for e in entries ],
+    }
+    with open(sidecar_path(path), 'w', encoding='UTF-8') as f:
+        json.dump(sidecar, f, indent=1)
+
+def read_index(platform, path):
+    ''' Read and return the index of the archive at `path` from its
+        sidecar file. `None` is returned if there is no sidecar or it is
+        stale or for a different platform.
+    '''
+    try:
+        with open(sidecar_path(path), encoding='UTF-8') as f:
+            sidecar = json.load(f)
+    except FileNotFoundError:
+        return None
+    if sidecar.get('version') != SIDECAR_VERSION \
+            or sidecar.get('platform') != platform \
+            or sidecar.get('archive') != _archive_stamp(path):
+        v1('ignoring stale index {!r}', sidecar_path(path))
+        return None
+    return [ IndexEntry(e['offset'], e['length'], e['filename'],
+                e['filetype'], tuple(e['blocks']))
+             for e in sidecar['files'] ]
+
+def load_index(platform, path):
+    ''' Return the index of the archive at `path`, reading it from the
+        sidecar file if that is up to date, otherwise building it and
+        (if possible) saving it to the sidecar file.
+    '''
+    entries = read_index(platform, path)
+    if entries is None:
+        entries = build_index(platform, path)
+        try:
+            write_index(platform, path, entries)
+        except OSError as ex:
+            v1('cannot write index {!r}: {}', sidecar_path(path), ex)
+    return entries
+
+def find_entry(entries, number=None, name=None):
+    ''' Return the entry in `entries` that is file `number` (counting
+        from 0) or that has filename `name`. The first matching file is
+        returned if several have the same name. A `LookupError` is raised
+        if there is no such file.
+    '''
+    if number is not None:
+        if number < 0 or number >= len(entries):
+            raise LookupError('No file number {} in archive of {} files'
+                .format(number, len(entries)))
+        return entries[number]
+    for e in entries:
+        if e.filename == name:
+            return e
+    raise LookupError('No file named {!r} in archive'.format(name))
+
+def read_entry(platform, stream, entry):
+    ''' Seek to the file given by index entry `entry` in `stream`, a
+        seekable stream of the archive, and return its blocks.
+    '''
+    stream.seek(entry.offset)
+    return read_block_bytestream(platform, stream)
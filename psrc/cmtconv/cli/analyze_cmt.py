@@ -10,16 +10,23 @@
 from    argparse import ArgumentParser
 from    functools import partial
 from    itertools import chain
+import  csv
+import  json
 import  math
-import  statistics
 import  sys
 import  wave
 
 from    cmtconv.analyze import *
 import  cmtconv.audio as au, cmtconv.logging as lg
+import  cmtconv.bytestream as bs
 
 parseint = partial(int, base=0)     # Parse an int recognizing 0xNN etc.
 
+def position(s):
+    ' Validate a time in seconds or ``@N`` sample number in an audio file. '
+    bs.wav_position(s, 1)
+    return s
+
 def parse_args():
     p = ArgumentParser(description='''
             Analyse tape format audio''',
@@ -28,6 +35,8 @@ def parse_args():
     a = p.add_argument
     a('-r', '--report-bauds', action='store_true' ) # count cycles per well-known baud rates
     a(      '--baud', type=float, default=1200)
+    a('-F', '--report-format', choices=('table', 'csv', 'json'),
+        default='table', help='format for --report-bauds output')
     a('-g', '--gradient-factor',type=float, default=0.5)
     a('-t', '--tolerance',type=float, default=0.25)
     a('-d', '--dump-pulses', action='store_true')
@@ -36,12 +45,19 @@ def parse_args():
         "BITSTREAM='line' for one symbol per line; "
         "'char' for just the 0/1 symbols on one line")
     a('-B', '--bytes', action='store_true')
+    a('-A', '--auto', action='store_true', help=\
+        'detect mark/space bauds, pulses per bit and start/stop bits'
+        ' and use them instead of the options below')
     a('-m', '--mark-baud', type=int, default=2400)
     a('--mark-pulses', type=int, default=2, help=\
         'number of mark-baud pulses for a single mark bit')
     a('-s', '--space-baud', type=int, default=1200)
     a('--space-pulses', type=int, default=2, help=\
         'number of space-baud pulses for a single space bit')
+    a('--start-time', metavar='T', type=position, help=\
+        'analyse WAV input from T seconds (or sample N if @N)')
+    a('--end-time', metavar='T', type=position, help=\
+        'analyse WAV input up to T seconds (or sample N if @N)')
     a('--start', default='m')
     a('--stop', default='ss')
     a('--reverse-bits', action='store_true', help=\
@@ -89,60 +105,43 @@ def parse_args():
     return args
 
 def report_bauds(args, pulses):
-    bauds = list(reversed(sorted(
-        baud_rates(args.baud) + baud_rates(args.baud * 1.5))))
-    tol = args.tolerance
-    durs = [ (  b,
-                (1.0 + math.log(1.0 - tol)) * 0.5/b,
-                (1.0 + math.log(1.0 + tol)) * 0.5/b
-            ) for b in bauds ]
-    buckets = dict( (b, []) for b in bauds )
-    buckets['low'] = []
-    buckets['high'] = []
-    buckets['unknown'] = []
-
-    # classify each pulse width and add to relevant bucket
-    for (_,_, dur) in pulses:
-        if dur < durs[0][1]:
-            buckets['low'].append(dur)
-        elif dur > durs[-1][2]:
-            buckets['high'].append(dur)
-        else:
-            found = False
-            for (b,l,h) in durs:
-                if dur >= l and dur <= h:
-                    buckets[b].append(dur)
-                    found = True
-                    break
-            if not found:
-                buckets['unknown'].append(dur)
-    # calc stats
-    def calc_stats(ws):
-        c = len(ws)
-        if c > 1:
-            return (c, statistics.mean(ws), statistics.stdev(ws))
-        elif c > 0:
-            return (c, statistics.mean(ws), None)
-        else:
-            return (c, None, None)
-
-    stats = { k : calc_stats(ws) for k, ws in buckets.items() }
+    bauds = baud_rates(args.baud) + baud_rates(args.baud * 1.5)
+    hist = BaudHistogram(bauds, args.tolerance)
+    hist.add(pulses)
+    rows = hist.rows()
 
     def width(baud):
         try:
-            return "{:4.2f}us".format(1e6 * (0.5 / float(baud)))
+            return 1e6 * (0.5 / float(baud))
         except:
-            return "-"
+            return None
+    def us(t):
+        return None if t is None else 1e6 * t
+
+    if args.report_format == 'json':
+        json.dump([ { 'baud': baud, 'width_us': width(baud), 'count': c,
+                      'mean_us': us(m), 'stdev_us': us(s) }
+                    for (baud, c, m, s) in rows ],
+            sys.stdout, indent=1)
+        print()
+        return
+    if args.report_format == 'csv':
+        w = csv.writer(sys.stdout)
+        w.writerow(('baud', 'width_us', 'count', 'mean_us', 'stdev_us'))
+        for (baud, c, m, s) in rows:
+            w.writerow(( '' if v is None else v
+                for v in (baud, width(baud), c, us(m), us(s)) ))
+        return
 
-    # Report
     print("{:>16} {:>8} {:>13} {:>13}".format("Width us / Baud", "Count", "Mean us", "Stdev us"))
-    for baud in chain([ 'low' ], reversed(bauds), ['high', 'unknown']):
-        (c, m, s) = stats[baud]
+    for (baud, c, m, s) in rows:
         if m is None:   m_ = ""
         else:           m_ = "{:>6.3f}".format(1e6 * m)
         if s is None:   s_ = ""
         else:           s_ = "{:>6.3f}".format(1e6 * s)
-        baud_ = "{} /{:>5}".format(width(baud), baud)
+        w = width(baud)
+        w_ = "-" if w is None else "{:4.2f}us".format(w)
+        baud_ = "{} /{:>5}".format(w_, baud)
         print("{:>16} {:>8} {:>13} {:>13}".format(baud_, c, m_, s_))
 
 
@@ -257,32 +256,32 @@ def dump_bytes(args, pulses):
 
     print('Searching from {} - {}'.format(idx, pulses[idx][0]))
 
-    # Attempt to read a byte and keep trying until we get a byte
-    byte_read = False
-    while not byte_read and idx < len(pulses):
-        try:
-            i = idx
-            (idx, b) = pd.read_byte(pulses, idx)
-            byte_read = True
-            print('Byte read at {} - {}: {:02x}'.format(i, pulses[i][0], b))
-        except Exception as ex:
-            idx += 1
+    # Find the first position from which we can read a byte
+    r = pd.find_next_byte_alignment(pulses, idx)
+    if r is None:
+        print('No bytes found')
+        return None
+    (i, idx, b) = r
+    print('Byte read at {} - {}: {:02x}'.format(i, pulses[i][0], b))
+    # Time of pulse `i`, or of the last pulse if the data run to the end
+    t = lambda i: pulses[min(i, len(pulses) - 1)][0]
     c = '.' if b<32 or b>127 else chr(b)
-    print('{} {:012.6f}, {:02x}, {}'.format(idx, pulses[idx][0], b, c))
+    print('{} {:012.6f}, {:02x}, {}'.format(idx, t(idx), b, c))
     # Keep reading bytes until we can't
     err = 0
     while idx < len(pulses):
-        try:
-            (idx, b) = pd.read_byte(pulses, idx)
-            if err > 0:
-                print(
-                    '{} - {:012.6f}, failed to read byte for previous {} pulses'.format(idx, pulses[idx][0], err))
-                err=0
-            c = '.' if b<32 or b>127 else chr(b)
-            print('{}, {:012.6f}, {:02x}, {}'.format(idx, pulses[idx][0], b, c))
-        except Exception as ex:
+        r = pd.try_read_byte(pulses, idx)
+        if r is None:
             err += 1
             idx += 1
+            continue
+        (idx, b) = r
+        if err > 0:
+            print(
+                '{} - {:012.6f}, failed to read byte for previous {} pulses'.format(idx, t(idx), err))
+            err=0
+        c = '.' if b<32 or b>127 else chr(b)
+        print('{}, {:012.6f}, {:02x}, {}'.format(idx, t(idx), b, c))
     return None
 
 # def convert_to_pulses(args, pulses):
@@ -335,26 +334,43 @@ def save_wav(args, pulses, sample_dur):
     w.setframerate(44100)
     w.writeframes(bytes(samples))
 
+def auto_framing(args, pulses):
+    ''' Detect the framing of `pulses`, print it and set the decoding
+        parameters in `args` to use it.
+    '''
+    f = detect_framing(pulses, args.tolerance)
+    #   Messages go to stderr so as not to mix into -F json/csv reports.
+    if f is None:
+        print('Auto-detection failed: fewer than two pulse widths found',
+            file=sys.stderr)
+        exit(1)
+    print('Detected framing ({:.1f}% of pulses decoded): {}'.format(
+        100 * f.coverage, framing_args(f)), file=sys.stderr)
+    args.mark_baud, args.mark_pulses = f.mark_baud, f.mark_pulses
+    args.space_baud, args.space_pulses = f.space_baud, f.space_pulses
+    args.start, args.stop = f.start, f.stop
+    args.pulse_decoder = framing_decoder(f,
+        args.invert_bits, args.reverse_bits, args.tolerance)
+
 def main():
     args = parse_args()
-    print(args)
+    if args.verbose:
+        print(args, file=sys.stderr)    # stdout may be a -F json/csv report
     if args.from_pulses:
         pulses = load_pulses(args)
         sample_dur = 1.0 / 44100.0
     else:
-        w = wave.open(args.input, 'rb')
-        if w.getnchannels() != 1 or w.getsampwidth() != 1:
-            raise ValueError('Only mono 8-bit wav files are supported')
-        rate = w.getframerate()
-        n_samples = w.getnframes()
-        samples = w.readframes(n_samples)
+        (samples, rate, start_time) = bs.read_wav(args.input,
+            args.start_time, args.end_time)
         sample_dur = 1.0 / rate
         #pulses = au.samples_to_pulses(samples, sample_dur)
         pulses = au.samples_to_pulses_via_edge_detection(
-            samples, sample_dur, args.gradient_factor)
+            samples, sample_dur, args.gradient_factor, start_time)
         pulses = au.filter_clicks(pulses, sample_dur)
         if args.to_pulses:
             save_pulses(args, pulses, sample_dur)
+    if args.auto:
+        auto_framing(args, pulses)
     if args.report_bauds:
         report_bauds(args, pulses)
     if args.dump_pulses:
@@ -6,10 +6,19 @@ from    functools import partial
 import  sys, os
 
 import  cmtconv.formats as fm, cmtconv.logging as lg
+import  cmtconv.bytestream as bs
+import  cmtconv.casindex as ci
+import  cmtconv.verify as vf
+from    cmtconv.audio  import ReadError
 
 
 parseint = partial(int, base=0)     # Parse an int recognizing 0xNN etc.
 
+def position(s):
+    ' Validate a time in seconds or ``@N`` sample number in an audio file. '
+    bs.wav_position(s, 1)
+    return s
+
 def parse_args():
     p = ArgumentParser(description='''
             Convert computer audio tape saves between various formats.''',
@@ -28,6 +37,31 @@ def parse_args():
         help='load address to store in tape data')
     a('-t', '--filetype', metavar='TYPE', default=None,
         help='file type: BASIC or BINARY')
+    a('-L', '--list', action='store_true',
+        help='list the files in a multi-file .cas input and exit')
+    a('-n', '--file-number', metavar='N', type=int,
+        help='read file number N (from 0) of a multi-file .cas input')
+    a('-N', '--file-name', metavar='NAME',
+        help='read the file named NAME from a multi-file .cas input')
+    a('--start-time', metavar='T', type=position,
+        help='start reading WAV input at T seconds (or sample N if @N)')
+    a('--end-time', metavar='T', type=position,
+        help='stop reading WAV input at T seconds (or sample N if @N)')
+    a('--rate', metavar='HZ', type=int,
+        help='WAV or CSW output sample rate (default 44100)')
+    a('--bits', type=int, choices=(8, 16),
+        help='WAV output bits per sample (default 8)')
+    a('--channels', metavar='N', type=int,
+        help='WAV output channel count (default 1)')
+    a('--amplitude', metavar='A', type=float,
+        help='WAV output amplitude as a fraction of full scale (default 1.0)')
+    a('--verify', action='store_true',
+        help='check that the input survives encoding to and decoding'
+            ' from tape pulses')
+    a('--jitter', metavar='J', type=float, default=0.0,
+        help='--verify pulse width jitter as a fraction of width')
+    a('--noise', metavar='N', type=float, default=0.0,
+        help='--verify amplitude noise as a fraction of amplitude')
     a('-v', '--verbose', action='count', default=0)
 
     a('input', help="input file ('-' for stdin)")
@@ -43,8 +77,37 @@ def parse_args():
         val = getattr(args, argname)
         if val is not None: args.reader_optargs[argname] = val
 
+    for (argname, optname) in (('start_time', 'start'), ('end_time', 'end')):
+        val = getattr(args, argname)
+        if val is not None: args.reader_optargs[optname] = val
+
+    args.writer_optargs = {}
+    for argname in ('rate', 'bits', 'channels', 'amplitude'):
+        val = getattr(args, argname)
+        if val is not None: args.writer_optargs[argname] = val
+
     args.input_format  = fm.guess_format(args.input_format, args.input)
     args.output_format = fm.guess_format(args.output_format, args.output)
+    if (args.start_time or args.end_time) and args.input_format != 'wav':
+        p.error('--start-time and --end-time require wav input')
+    if set(args.writer_optargs) - {'rate'} and args.output_format != 'wav':
+        p.error('--bits, --channels and --amplitude require wav output')
+    if 'rate' in args.writer_optargs \
+            and args.output_format not in ('wav', 'csw'):
+        p.error('--rate requires wav or csw output')
+    if args.amplitude is not None and not 0.0 <= args.amplitude <= 1.0:
+        p.error('--amplitude must be in the range 0.0-1.0')
+    if args.channels is not None and args.channels < 1:
+        p.error('--channels must be at least 1')
+
+    args.indexed = args.list \
+        or args.file_number is not None or args.file_name is not None
+    if args.indexed and (args.input_format != 'cas' or args.input == '-'):
+        p.error('--list, --file-number and --file-name require'
+            ' a .cas input file')
+    args.input_path = args.input
+    if (args.jitter or args.noise) and not args.verify:
+        p.error('--jitter and --noise require --verify')
 
     #   You'd think we could use FileType, but in Python 3.5 even if
     #   you give it mode 'b', it still uses stdin/stdout as text.
@@ -55,12 +118,53 @@ def parse_args():
 
     return args
 
+def list_index(entries):
+    print('   #   offset   length  blocks    type              filename')
+    for n, e in enumerate(entries):
+        print('{:4} {:8} {:8} {:>4}-{:<4} {:17} {}'.format(n, e.offset,
+            e.length, e.blocks[0], e.blocks[1] - 1, e.filetype, e.filename))
+
+def verify(args, blocks):
+    ''' Verify `blocks` and print the result, returning `True` if they
+        round-tripped.
+    '''
+    try:
+        diffs = vf.verify(args.platform, blocks, args.jitter, args.noise)
+    except ReadError as ex:
+        print('verify: FAILED: cannot decode: {}'.format(ex), file=sys.stderr)
+        return False
+    for d in diffs:
+        print('verify: block {} differs:\n  expected {}\n  actual   {}'
+            .format(d.index, d.expected and d.expected.hex(),
+                d.actual and d.actual.hex()), file=sys.stderr)
+    if diffs:
+        print('verify: FAILED: {} of {} blocks differ'
+            .format(len(diffs), len(blocks)), file=sys.stderr)
+        return False
+    print('verify: OK: {} blocks'.format(len(blocks)), file=sys.stderr)
+    return True
+
 def main():
     args = parse_args()
-    reader = fm.FORMATS[args.input_format][0]
-    blocks = reader(args.platform, args.input, **args.reader_optargs)
+    if args.indexed:
+        entries = ci.load_index(args.platform, args.input_path)
+        if args.list:
+            list_index(entries)
+            return
+        try:
+            entry = ci.find_entry(entries, args.file_number, args.file_name)
+        except LookupError as ex:
+            print('cmtconv: {}'.format(ex.args[0]), file=sys.stderr)
+            exit(1)
+        blocks = ci.read_entry(args.platform, args.input, entry)
+    else:
+        reader = fm.FORMATS[args.input_format][0]
+        blocks = reader(args.platform, args.input, **args.reader_optargs)
+
+    if args.verify and not verify(args, blocks):
+        exit(1)
 
     if args.output is not None:
         writer = fm.FORMATS[args.output_format][1]
-        writer(args.platform, blocks, args.output)
+        writer(args.platform, blocks, args.output, **args.writer_optargs)
         #   XXX relies on exit() to close files
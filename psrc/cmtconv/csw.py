@@ -0,0 +1,157 @@
+''' Read and write CSW (Compressed Square Wave) files.
+
+    A CSW file records a square wave as the lengths, in samples, of its
+    successive half-cycles ("pulses"), each of the opposite polarity to
+    the one before. This is the same information as the pulse lists used
+    by the platform `FileReader` and `FileEncoder` classes, so no sample
+    rendering or edge detection is needed to convert to and from it.
+
+    Version 2 files are written; version 1 and 2 files can be read. The
+    pulse data are run-length encoded (RLE): each pulse is one byte
+    giving its length, or a zero byte followed by a 32-bit little-endian
+    length for pulses longer than 255 samples. In Z-RLE files the RLE
+    data are further compressed with zlib.
+'''
+
+from    itertools  import chain
+import  struct
+import  zlib
+
+from    cmtconv.audio  import AudioMarker
+from    cmtconv.logging  import *
+
+MAGIC           = b'Compressed Square Wave\x1A'
+COMPRESS_RLE    = 1
+COMPRESS_ZRLE   = 2
+FLAG_POLARITY   = 0x01          # initial polarity is high
+#   Encoding application name stored in the header.
+APPLICATION     = b'r8format cmtconv'
+
+#   Header after the magic number and major and minor version bytes.
+#   v1: rate, compression, flags, 3 reserved
+HEADER_V1       = struct.Struct('<HBB3x')
+#   v2: rate, total pulses, compression, flags,
+#       header extension length, encoding application
+HEADER_V2       = struct.Struct('<IIBBB16s')
+
+def chunks_to_counts(chunks, rate):
+    ''' Convert `chunks`, the output of a platform ``FileEncoder``
+        (``(SILENCE, duration)`` and ``(SOUND, pulse_widths)`` tuples),
+        to a list of pulse lengths in samples at `rate` samples per
+        second.
+
+        Pulse end times are rounded to the nearest sample so that the
+        rounding error does not accumulate over a long recording. Each
+        silence becomes a single long pulse (a square wave has no "mid"
+        level) and pulses given as ``(width, level)`` tuples are treated
+        as single pulses of `width`.
+    '''
+    counts = []
+    t = 0.0
+    end = 0
+    for chunk in chunks:
+        if chunk[0] == AudioMarker.SILENCE:
+            widths = (chunk[1],)
+        elif chunk[0] == AudioMarker.SOUND:
+            widths = chunk[1]
+        else:
+            raise Exception('Unknown audio marker')
+        for w in widths:
+            if type(w) is tuple: w = w[0]
+            t += w
+            n = max(1, int(0.5 + t * rate) - end)
+            counts.append(n)
+            end += n
+    return counts
+
+def counts_to_pulses(counts, rate, polarity=1):
+    ''' Convert `counts`, a sequence of pulse lengths in samples at `rate`
+        samples per second, to a tuple of pulses as produced by
+        `samples_to_pulses_via_edge_detection()`: ``(end_time, level,
+        duration)`` where `level` alternates between 1 and -1, starting
+        with `polarity`.
+    '''
+    res = []
+    sample_dur = 1.0 / rate
+    end = 0
+    lvl = polarity
+    for n in counts:
+        end += n
+        res.append((end * sample_dur, lvl, n * sample_dur))
+        lvl = -lvl
+    return tuple(res)
+
+def encode_rle(counts):
+    ' Return the `bytes` of the CSW RLE encoding of pulse lengths `counts`. '
+    #   A single bytes() call over a generator is much faster than
+    #   appending to a bytearray pulse by pulse.
+    return bytes(chain.from_iterable(
+        (n,) if n < 0x100 else (0,) + tuple(n.to_bytes(4, 'little'))
+        for n in counts ))
+
+def decode_rle(data):
+    ''' Return a list of the pulse lengths in CSW RLE-encoded `data`.
+        A `ValueError` is raised if the data are truncated.
+    '''
+    counts = []
+    i = 0
+    n = len(data)
+    while i < n:
+        c = data[i]
+        if c:
+            counts.append(c); i += 1
+        else:
+            if i + 5 > n:
+                raise ValueError('Truncated long pulse at offset {}'.format(i))
+            counts.append(int.from_bytes(data[i+1:i+5], 'little')); i += 5
+    return counts
+
+def write_csw(stream, counts, rate, polarity=1, compress=True):
+    ''' Write a CSW v2 file of pulse lengths `counts` at `rate` samples per
+        second to `stream`. The first pulse is high if `polarity` is 1,
+        low if it is -1. If `compress` is true the data are written as
+        Z-RLE, otherwise as RLE.
+    '''
+    data = encode_rle(counts)
+    if compress:
+        data = zlib.compress(data)
+    stream.write(MAGIC + bytes((2, 0)))
+    stream.write(HEADER_V2.pack(rate, len(counts),
+        COMPRESS_ZRLE if compress else COMPRESS_RLE,
+        FLAG_POLARITY if polarity > 0 else 0, 0, APPLICATION))
+    stream.write(data)
+
+def read_csw(stream):
+    ''' Read a CSW v1 or v2 file from `stream` and return a tuple of the
+        sample rate, the polarity (1 or -1) of the first pulse and a list
+        of the pulse lengths. A `ValueError` is raised if the file is not
+        a CSW file or is of an unsupported version or compression type.
+    '''
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise ValueError('Not a CSW file')
+    (major, minor) = stream.read(2)
+    if major == 1:
+        (rate, compression, flags) \
+            = HEADER_V1.unpack(stream.read(HEADER_V1.size))
+        npulses = None
+    elif major == 2:
+        (rate, npulses, compression, flags, extlen, app) \
+            = HEADER_V2.unpack(stream.read(HEADER_V2.size))
+        stream.read(extlen)
+        v2('CSW application: {}', app.rstrip(b'\x00').decode('ISO-8859-1'))
+    else:
+        raise ValueError('Unsupported CSW version {}'.format(major))
+    v2('CSW v{}.{}, rate {}, compression {}, flags {:02X}',
+        major, minor, rate, compression, flags)
+
+    data = stream.read()
+    if compression == COMPRESS_ZRLE and major >= 2:
+        data = zlib.decompress(data)
+    elif compression != COMPRESS_RLE:
+        raise ValueError('Unsupported CSW compression type {}'
+            .format(compression))
+    counts = decode_rle(data)
+    if npulses is not None and npulses != len(counts):
+        v1('CSW header gives {} pulses but {} were read',
+            npulses, len(counts))
+    return (rate, 1 if flags & FLAG_POLARITY else -1, counts)
@@ -18,6 +18,9 @@ FORMATS = {
     'wav': ( bs.blocks_from_audio,      # (platform, stream)
              bs.blocks_to_audio,        # (platform, blocks, stream)
         ),
+    'csw': ( bs.blocks_from_csw,        # (platform, stream)
+             bs.blocks_to_csw,          # (platform, blocks, stream)
+        ),
     'obj': ( bs.blocks_from_obj,        # (platform,stream, filename)
              None,
         ),
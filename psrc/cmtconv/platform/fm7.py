@@ -171,7 +171,9 @@ class DataBlock(Block):
 
     def setdata(self, data, checksum=None):
         expected_checksum = (self._calc_checksum(data) + len(data) + 1) % 0x100
-        v3('Checksum = {:02X}, Expected = {:02X}', checksum, expected_checksum)
+        if checksum is not None:
+            v3('Checksum = {:02X}, Expected = {:02X}', checksum,
+                expected_checksum)
         if checksum is not None and expected_checksum != checksum:
             raise self.ChecksumError('expected={:02X}, actual={:02X}'.format(
                 expected_checksum, checksum))
@@ -346,11 +348,30 @@ class FileReader(object):
 def read_block_bytestream(stream):
     ''' Read bytes from `stream`, parse them as FM-7 blocks
         and return a sequence of the block objects.
+
+        Only the blocks of the first file in `stream` are read; the
+        stream is left positioned at the start of the next file, if any.
+    '''
+    return _read_file_blocks(stream, stream.read(Block.BLOCK_HEADER_LEN))
+
+def read_block_bytestreams(stream):
+    ''' Generate, for each file in `stream` in turn, a sequence of the
+        block objects for that file. Reading stops at EOF, and only one
+        file's blocks are held in memory at a time.
+    '''
+    while True:
+        bh = stream.read(Block.BLOCK_HEADER_LEN)
+        if len(bh) == 0:
+            return
+        yield _read_file_blocks(stream, bh)
+
+def _read_file_blocks(stream, bh):
+    ''' Given the already-read block header `bh` of the first block of
+        a file, read that and the remaining blocks of the file from `stream`.
     '''
     blocks = []
     blk = None
-    while blk is None or not blk.is_eof:
-        bh = stream.read(Block.BLOCK_HEADER_LEN)
+    while True:
         if bh[2] == Block.BlockType.HEADER:
             v3('Header block')
             (blk, datalen) = HeaderBlock.from_header(bh)
@@ -369,8 +390,35 @@ def read_block_bytestream(stream):
         else:
             raise ValueError('Unrecognised block type: {:02X}'.format(bh[2]))
         blocks.append(blk)
+        if blk.is_eof:
+            break
+        bh = stream.read(Block.BLOCK_HEADER_LEN)
     return tuple(blocks)
 
+def scan_block_bytestream(buf, offset):
+    ''' Scan the block headers of the file starting at `offset` in `buf`
+        (any bytes-like object, such as an `mmap`) without reading or
+        checking the block data. Return a tuple of the offset following
+        the file, the filename (`bytes`), the file type name and the
+        number of blocks in the file.
+    '''
+    filename = filetype = None
+    pos = offset
+    nblocks = 0
+    while True:
+        bh = buf[pos:pos+Block.BLOCK_HEADER_LEN]
+        if len(bh) != Block.BLOCK_HEADER_LEN:
+            raise ValueError('Short block header at offset {}'.format(pos))
+        Block._check_magic(bh)
+        nblocks += 1
+        pos += Block.BLOCK_HEADER_LEN
+        if bh[2] == Block.BlockType.END:
+            return (pos, filename, filetype, nblocks)
+        if bh[2] == Block.BlockType.HEADER and filename is None:
+            filename = bytes(buf[pos:pos+8]).rstrip(b' ')
+            filetype = Block.FileType(buf[pos+8]).name
+        pos += bh[3] + 1
+
 def blocks_from_bin(stream, loadaddr=0x0000, filename=None):
     ''' Read file content bytes from `stream` and create a sequence of tape
         block objects representing that file as data to be loaded
@@ -345,9 +345,29 @@ class FileHeader(Block):
 def read_block_bytestream(stream):
     ''' Read bytes from `stream`, parse them as JR-200 blocks
         and return a sequence of the block objects.
+
+        Only the blocks of the first file in `stream` are read; the
+        stream is left positioned at the start of the next file, if any.
+    '''
+    return _read_file_blocks(stream, stream.read(FileHeader.blocklen))
+
+def read_block_bytestreams(stream):
+    ''' Generate, for each file in `stream` in turn, a sequence of the
+        block objects for that file. Reading stops at EOF, and only one
+        file's blocks are held in memory at a time.
+    '''
+    while True:
+        headerbytes = stream.read(FileHeader.blocklen)
+        if len(headerbytes) == 0:
+            return
+        yield _read_file_blocks(stream, headerbytes)
+
+def _read_file_blocks(stream, headerbytes):
+    ''' Given the already-read `headerbytes` of a `FileHeader`, read the
+        remaining blocks of that file from `stream`.
     '''
     blocks = []
-    fh = FileHeader.from_bytes(stream.read(FileHeader.blocklen))
+    fh = FileHeader.from_bytes(headerbytes)
     blocks.append(fh)
     while True:
         b, len = Block.from_header(stream.read(Block.headerlen))
@@ -359,6 +379,31 @@ def read_block_bytestream(stream):
             break
     return tuple(blocks)
 
+def scan_block_bytestream(buf, offset):
+    ''' Scan the block headers of the file starting at `offset` in `buf`
+        (any bytes-like object, such as an `mmap`) without reading or
+        checking the block data. Return a tuple of the offset following
+        the file, the filename (`bytes`), the file type name and the
+        number of blocks in the file.
+    '''
+    fh = buf[offset:offset+FileHeader.blocklen]
+    if len(fh) != FileHeader.blocklen:
+        raise ValueError('Short file header at offset {}'.format(offset))
+    FileHeader._check_magic(fh)
+    filename = bytes(fh[Block.headerlen:Block.headerlen+16]).rstrip(b'\x00')
+    filetype = FileHeader.FileType(fh[Block.headerlen+16]).name
+    pos = offset + FileHeader.blocklen
+    nblocks = 1
+    while True:
+        h = buf[pos:pos+Block.headerlen]
+        if len(h) != Block.headerlen:
+            raise ValueError('Short block header at offset {}'.format(pos))
+        Block._check_magic(h)
+        nblocks += 1
+        if h[2] == 0xFF and h[3] == 0xFF:       # EOF block
+            return (pos + Block.headerlen, filename, filetype, nblocks)
+        pos += Block.headerlen + (h[3] or 0x100) + 1
+
 def blocks_from_bin(stream, loadaddr=0x0000, filename=None):
     ''' Read file content bytes from `stream` and create a sequence of tape
         block objects representing that file as data to be loaded
@@ -354,10 +354,72 @@ class FileReader(object):
 def read_block_bytestream(stream):
     ''' Read bytes from `stream`, parse them as MB-6885 blocks
         and return a sequence of the block objects.
+
+        Only the blocks of the first file in `stream` are read; the
+        stream is left positioned at the start of the next file, if any.
+    '''
+    return _read_file_blocks(stream, stream.read(Block.HEADERLEN))
+
+def read_block_bytestreams(stream):
+    ''' Generate, for each file in `stream` in turn, a sequence of the
+        block objects for that file. Reading stops at EOF, and only one
+        file's blocks are held in memory at a time.
+    '''
+    while True:
+        headerbytes = stream.read(Block.HEADERLEN)
+        if len(headerbytes) == 0:
+            return
+        yield _read_file_blocks(stream, headerbytes)
+
+def _read_file_blocks(stream, headerbytes):
+    ''' Given the already-read `headerbytes` of the first block of a file,
+        read that and the remaining blocks of the file from `stream`.
     '''
     blocks = []
+    while True:
+        (block, datalen) = Block.from_header(headerbytes)
+        bs = stream.read(datalen + 2)       # data, checksum, end magic
+        if len(bs) != datalen + 2:
+            raise ValueError('Short block ${:02X}: expected={} actual={}'
+                .format(block.block_num, datalen + 2, len(bs)))
+        block.setdata(bs[:-2], bs[-2], bs[-1])
+        blocks.append(block)
+        if block.is_eof:
+            break
+        headerbytes = stream.read(Block.HEADERLEN)
     return tuple(blocks)
 
+def scan_block_bytestream(buf, offset):
+    ''' Scan the block headers of the file starting at `offset` in `buf`
+        (any bytes-like object, such as an `mmap`) without reading or
+        checking the block data. Return a tuple of the offset following
+        the file, the filename (`bytes`, without padding), the file type
+        name and the number of blocks in the file.
+    '''
+    filename = filetype = None
+    pos = offset
+    nblocks = 0
+    while True:
+        h = buf[pos:pos+Block.HEADERLEN]
+        if len(h) != Block.HEADERLEN:
+            raise ValueError('Short block header at offset {}'.format(pos))
+        Block._check_magic(h)
+        if filename is None:
+            fn = bytes(h[4:12])
+            filename = fn[:-2].rstrip(b' ') + fn[-2:]
+            filetype = Block.FileType(h[2]).name
+        datalen = h[13] or 0x100
+        nblocks += 1
+        data = pos + Block.HEADERLEN
+        pos = data + datalen + 2
+        if pos > len(buf):
+            raise ValueError('Short block data at offset {}'.format(data))
+        #   Same EOF conditions as `Block.is_eof`.
+        if h[2] == Block.AUX:
+            if h[3] == 0 or (h[14] == 0x06 and h[15] == 0x00
+                    and datalen == 1 and buf[data] == 0xFF):
+                return (pos, filename, filetype, nblocks)
+
 def blocks_from_bin(stream, loadaddr=0x0000, filename=None):
     ''' Read file content bytes from `stream` and create a sequence of tape
         block objects representing that file as data to be loaded
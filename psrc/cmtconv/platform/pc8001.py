@@ -1,6 +1,7 @@
 ''' cmtconv.platform.pc8001
 '''
 from    enum  import IntEnum
+import  re
 from    itertools  import chain
 from    cmtconv.logging  import *
 from    cmtconv.audio  import PulseDecoder, PULSE_MARK, PULSE_SPACE, \
@@ -276,14 +277,17 @@ class FileReader(object):
             data = bytearray()
             (i_next, b) = self.pd.read_byte(pulses, i_next)
             data.append(b)
-            eof = False
-            while not eof:
-                try:
-                    (i_next, b) = self.pd.read_byte(pulses, i_next)
-                    data.append(b)
-                except ReadError as e:
-                    v3('Error on presumed last byte:\n{}'.format(e))
-                    eof = True
+            while True:
+                r = self.pd.try_read_byte(pulses, i_next)
+                if r is None:
+                    v3('No byte at {}; presumed end of data', i_next)
+                    break
+                (i_next, b) = r
+                data.append(b)
+            #   As with `_read_basic_text()`, the trailer is not part of
+            #   the text; `BASICTextBlock.to_bytes()` adds it back.
+            if data.endswith(bytes(BASIC_TRAILER_LEN)):
+                del data[-BASIC_TRAILER_LEN:]
             textblk = BASICTextBlock()
             textblk.setdata(data)
             return (i_next, (hdrblk, textblk))
@@ -324,21 +328,155 @@ class FileReader(object):
 
 
 def read_block_bytestream(stream):
-    blocks = []
-    blk = None
-    bs = stream.read()
+    ''' Read bytes from `stream`, parse them as the blocks of a single
+        PC-8001 file (BASIC or binary) and return a sequence of the blocks.
+
+        Finding the end of a BASIC file requires reading ahead into
+        the next file, so `stream` may be left positioned past the end
+        of the file. Use `read_block_bytestreams()` to read multiple files.
+    '''
+    return _read_file_blocks(_ReadAhead(stream))
+
+def read_block_bytestreams(stream):
+    ''' Generate, for each file in `stream` in turn, a sequence of the
+        block objects for that file. Reading stops at EOF, and only one
+        file's blocks are held in memory at a time.
+    '''
+    ra = _ReadAhead(stream)
+    while len(ra.peek(1)) > 0:
+        yield _read_file_blocks(ra)
+
+class _ReadAhead(object):
+    ''' A minimal read-ahead buffer over a stream, allowing data read
+        from the stream to be pushed back for the next `read()`.
+    '''
+
+    CHUNKLEN = 4096
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buf = b''
+
+    def peek(self, n):
+        if len(self.buf) < n:
+            self.buf += self.stream.read(n - len(self.buf))
+        return self.buf[:n]
+
+    def read(self, n):
+        self.peek(n)
+        bs, self.buf = self.buf[:n], self.buf[n:]
+        return bs
+
+    def unread(self, bs):
+        self.buf = bytes(bs) + self.buf
+
+def _read_file_blocks(ra):
     magiclen = len(BASICHeaderBlock.MAGIC)
-    if bs[0:magiclen] == BASICHeaderBlock.MAGIC:
+    lead = ra.peek(magiclen)
+    if lead == BASICHeaderBlock.MAGIC:
         v3('Header block')
-        (blk, datalen) = BASICHeaderBlock.from_header(bs[0:magiclen])
-        blk.setdata(bs[magiclen:magiclen+datalen])
-        blocks.append(blk)
-        blk = BASICTextBlock()
-        blk.setdata(bs[magiclen+datalen:])
-        blocks.append(blk)
+        (blk, datalen) = BASICHeaderBlock.from_header(ra.read(magiclen))
+        blk.setdata(ra.read(datalen))
+        textblk = BASICTextBlock()
+        textblk.setdata(_read_basic_text(ra))
+        return (blk, textblk)
+    elif lead[0:1] == b':':
+        v3('Binary data blocks')
+        bs = ra.read(6)
+        (blk, datalen) = BinaryDataBlock.from_header(bs, first=True)
+        blocks = [blk]
+        while True:
+            bs = ra.read(datalen + 1)
+            if len(bs) != datalen + 1:
+                raise ReadError('Short data block: expected={} actual={}'
+                    .format(datalen + 1, len(bs)))
+            blk.setdata(bs[:-1], bs[-1])
+            if datalen == 0:
+                break
+            (blk, datalen) = BinaryDataBlock.from_header(ra.read(2))
+            blocks.append(blk)
+        return tuple(blocks)
+    else:
+        raise ReadError('Unknown file type, lead bytes: {}'.format(lead))
+
+#   The BASIC text is followed by a run of 0x00 bytes; this is the
+#   only indication we have of where the file ends.
+BASIC_TRAILER_LEN = 10
+BASIC_TRAILER = re.compile(b'\\x00{%d,}' % BASIC_TRAILER_LEN)
+
+def _read_basic_text(ra):
+    ''' Read the BASIC text and its trailer from `ra`, returning the text
+        without the trailer.
+
+        Tokenized BASIC may itself contain runs of 0x00 bytes (e.g., a
+        double-precision zero constant at the end of a line), so a run of
+        at least `BASIC_TRAILER_LEN` 0x00 bytes is considered to end the
+        file only if it is followed by EOF or the start of another file.
+        Any data read past the trailer is pushed back on to `ra`.
+    '''
+    text = bytearray()
+    pos = 0
+    eof = False
+    while True:
+        m = BASIC_TRAILER.search(text, pos)
+        if m is not None:
+            end = m.end()
+            following = text[end:end+len(BASICHeaderBlock.MAGIC)]
+            if len(following) < len(BASICHeaderBlock.MAGIC) and not eof:
+                pass                            # need more data to decide
+            elif len(following) == 0 \
+                    or following == BASICHeaderBlock.MAGIC \
+                    or following[0:1] == b':':
+                ra.unread(text[end:])
+                return bytes(text[:end-BASIC_TRAILER_LEN])
+            else:
+                pos = end
+                continue
+        elif eof:
+            v3('No trailer found after BASIC text')
+            return bytes(text)
+        else:
+            #   Any trailer must now start in data not yet read.
+            pos = max(pos, len(text) - BASIC_TRAILER_LEN)
+        chunk = ra.read(ra.CHUNKLEN)
+        if len(chunk) == 0:     eof = True
+        else:                   text += chunk
+
+def scan_block_bytestream(buf, offset):
+    ''' Scan the file starting at `offset` in `buf` (any bytes-like
+        object, such as an `mmap`) without reading or checking the file
+        data. Return a tuple of the offset following the file, the
+        filename (`bytes`), the file type name and the number of blocks
+        in the file.
+    '''
+    magiclen = len(BASICHeaderBlock.MAGIC)
+    if buf[offset:offset+magiclen] == BASICHeaderBlock.MAGIC:
+        fnoffset = offset + magiclen
+        filename = bytes(
+            buf[fnoffset:fnoffset+BASICHeaderBlock.FILE_NAME_LENGTH])
+        pos = fnoffset + BASICHeaderBlock.FILE_NAME_LENGTH
+        while True:
+            m = BASIC_TRAILER.search(buf, pos)
+            if m is None:
+                return (len(buf), filename.rstrip(b'\x00'), 'BASIC', 2)
+            following = buf[m.end():m.end()+magiclen]
+            if len(following) == 0 or following == BASICHeaderBlock.MAGIC \
+                    or following[0:1] == b':':
+                return (m.end(), filename.rstrip(b'\x00'), 'BASIC', 2)
+            pos = m.end()
+    elif buf[offset:offset+1] == b':':
+        pos = offset + 4                        # skip load address header
+        nblocks = 0
+        while True:
+            h = buf[pos:pos+2]
+            if len(h) != 2 or h[0] != 0x3A:
+                raise ReadError('Expected 0x3A at offset {}'.format(pos))
+            nblocks += 1
+            pos += 2 + h[1] + 1
+            if h[1] == 0:
+                return (pos, b'', 'BINARY', nblocks)
     else:
-        raise ValueError('FIXME: BinaryDataBlock not yet supported')
-    return tuple(blocks)
+        raise ReadError('Unknown file type at offset {}'.format(offset))
 
 def blocks_from_bin(stream, loadaddr=0x8020, filename=None, filetype=None):
     ''' Read file content bytes from `stream` and create a sequence of tape
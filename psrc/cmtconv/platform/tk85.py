@@ -212,18 +212,56 @@ class FileReader(object):
 
 
 def read_block_bytestream(stream):
-    blocks = []
-    blk = None
-    bs = stream.read()
-    hdrblk = HeaderBlock.from_header(bs[0:Block.HEADER_BLOCK_LEN])
-    chksum = bs[Block.HEADER_BLOCK_LEN]
+    ''' Read bytes from `stream`, parse them as the TK-85 header and
+        data blocks of a single file and return a sequence of the blocks.
+        The stream is left positioned at the start of the next file, if any.
+    '''
+    return _read_file_blocks(stream, stream.read(Block.HEADER_BLOCK_LEN+1))
+
+def read_block_bytestreams(stream):
+    ''' Generate, for each file in `stream` in turn, a sequence of the
+        block objects for that file. Reading stops at EOF, and only one
+        file's blocks are held in memory at a time.
+    '''
+    while True:
+        headerbytes = stream.read(Block.HEADER_BLOCK_LEN+1)
+        if len(headerbytes) == 0:
+            return
+        yield _read_file_blocks(stream, headerbytes)
+
+def _read_file_blocks(stream, headerbytes):
+    ''' Given the already-read `headerbytes` (header and its checksum),
+        read the data block of the file from `stream`.
+    '''
+    hdrblk = HeaderBlock.from_header(headerbytes[0:Block.HEADER_BLOCK_LEN])
+    chksum = headerbytes[Block.HEADER_BLOCK_LEN]
     if chksum != hdrblk.checksum:
         raise Block.ChecksumError('expected={:02X}, actual={:02X}'.format(
             hdrblk.checksum, chksum))
+    datalen = hdrblk.end_addr - hdrblk.start_addr + 1
+    bs = stream.read(datalen + 1)
+    if len(bs) != datalen + 1:
+        raise ReadError('Short data block: expected={} actual={}'
+            .format(datalen + 1, len(bs)))
     datablk = DataBlock.make_block()
-    datablk.setdata(bs[Block.HEADER_BLOCK_LEN+1:-1], bs[-1])
+    datablk.setdata(bs[:-1], bs[-1])
     return (hdrblk, datablk)
 
+def scan_block_bytestream(buf, offset):
+    ''' Scan the header of the file starting at `offset` in `buf` (any
+        bytes-like object, such as an `mmap`) without reading or checking
+        the file data. Return a tuple of the offset following the file,
+        the filename (the file number as `bytes`), the file type name and
+        the number of blocks in the file.
+    '''
+    hdrblk = HeaderBlock.from_header(buf[offset:offset+Block.HEADER_BLOCK_LEN])
+    datalen = hdrblk.end_addr - hdrblk.start_addr + 1
+    nextoffset = offset + Block.HEADER_BLOCK_LEN + 1 + datalen + 1
+    if nextoffset > len(buf):
+        raise ValueError('Short file at offset {}'.format(offset))
+    filenum = buf[offset+1]
+    return (nextoffset, str(filenum).encode('ASCII'), 'BINARY', 2)
+
 def blocks_from_bin(stream, loadaddr=0x8000, filename=None, filetype=None):
     ''' Read file content bytes from `stream` and create a sequence of tape
         block objects representing that file as data to be loaded
@@ -0,0 +1,49 @@
+''' Support for unit tests: tape blocks of test files for each platform.
+
+    Tests that run over all platforms parametrize on `PLATFORMS` (or
+    `PLATFORM_VARIANTS`) and make their files with `platform_blocks()`
+    rather than each building their own table of block constructors.
+'''
+
+from    io  import BytesIO
+
+from    cmtconv.bytestream  import blocks_from_bin
+
+#   All platforms with block modules.
+PLATFORMS = ('JR-200', 'PC-8001', 'TK-85', 'MB-6885', 'FM-7')
+
+#   Each platform with no extra `platform_blocks()` arguments, and also
+#   PC-8001 BASIC, whose block structure differs from PC-8001 binary.
+PLATFORM_VARIANTS = tuple( (p, {}) for p in PLATFORMS ) \
+    + (('PC-8001', { 'filetype': 'BASIC', 'filename': 'pcfile' }),)
+
+#   Default `blocks_from_bin()` arguments for a test file on each platform.
+BIN_ARGS = {
+    'JR-200':   { 'loadaddr': 0x1000, 'filename': 'jrfile' },
+    'PC-8001':  { 'loadaddr': 0xC000, 'filetype': 'BINARY' },
+    'TK-85':    { 'filename': '3' },
+    'MB-6885':  { 'loadaddr': 0x2000, 'filename': 'TEST.B' },
+}
+
+def platform_blocks(platform, data, **kwargs):
+    ''' Return the blocks of a test file with contents `data` on
+        `platform`, made by `blocks_from_bin()` with the platform's
+        `BIN_ARGS` overridden by `kwargs`.
+
+        FM-7 blocks are made directly, since its `blocks_from_bin()` does
+        not produce FM-7 blocks; only a `filename` argument is used.
+    '''
+    if platform == 'FM-7':
+        return fm7_blocks(data, **kwargs)
+    args = dict(BIN_ARGS[platform], **kwargs)
+    return blocks_from_bin(platform, BytesIO(data), **args)
+
+def fm7_blocks(data, filename='PROGNAME'):
+    ' Return FM-7 header, data and end blocks for a file of `data`. '
+    from cmtconv.platform import fm7
+    blocks = [ fm7.HeaderBlock.make_block(filename, 2, 0) ]
+    for i in range(0, len(data), 0xFF):
+        blocks.append(fm7.DataBlock.make_block())
+        blocks[-1].setdata(data[i:i+0xFF])
+    blocks.append(fm7.EndBlock.make_block())
+    return blocks
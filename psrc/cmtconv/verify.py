@@ -0,0 +1,109 @@
+''' In-memory round-trip verification of tape encoding.
+
+    `verify()` encodes blocks with the platform `FileEncoder`, converts the
+    encoder output directly to the pulses that edge detection would find
+    in a recording of it (optionally perturbed by timing jitter and
+    amplitude noise), decodes them with the platform `FileReader`, and
+    compares the decoded blocks with the originals. No audio samples are
+    rendered or analysed, so this is fast enough to check every platform
+    on every test run.
+'''
+
+from    collections  import namedtuple
+from    itertools  import zip_longest
+import  random
+
+from    cmtconv.audio  import AudioMarker
+from    cmtconv.bytestream  import get_block_module
+from    cmtconv.logging  import *
+
+BlockDiff = namedtuple('BlockDiff', 'index expected actual')
+BlockDiff.__doc__ = \
+    ''' A block that did not round-trip: the `index` of the block in the
+        file, and the `bytes` of the `expected` (original) and `actual`
+        (decoded) blocks. `expected` or `actual` is `None` if the decoded
+        file had more or fewer blocks than the original.
+    '''
+
+def chunks_to_pulses(chunks, jitter=0.0, noise=0.0, rng=random):
+    ''' Convert `chunks`, the output of a platform ``FileEncoder``, to a
+        tuple of ``(end_time, level, duration)`` pulses as produced by
+        `samples_to_pulses_via_edge_detection()` from a recording of it.
+
+        Levels are assigned as in `pulses_to_samples2()`: silence is level
+        0 and sound pulses alternate between 1 and -1, unless given as
+        ``(width, level)`` tuples. Adjacent pulses of the same level are
+        merged, as there is no edge between them.
+
+        - `jitter` is the standard deviation of a normally distributed
+          error in each pulse width, as a fraction of the width.
+        - `noise` is the standard deviation of normally distributed noise
+          added to each pulse's level (as a fraction of the amplitude)
+          before it is quantized to -1, 0 or 1 as by edge detection.
+        - `rng` is the `random.Random` (or `random` module) used to
+          generate the jitter and noise.
+    '''
+    widths = []
+    lvl = 0
+    for chunk in chunks:
+        if chunk[0] == AudioMarker.SILENCE:
+            pulses = ((chunk[1], 0),)
+        elif chunk[0] == AudioMarker.SOUND:
+            pulses = chunk[1]
+        else:
+            raise Exception('Unknown audio marker')
+        for d in pulses:
+            if type(d) is tuple:
+                (w, lvl) = d
+            else:
+                w = d
+                lvl = 1 if lvl == 0 else -lvl
+            if widths and widths[-1][1] == lvl:
+                widths[-1][0] += w
+            else:
+                widths.append([w, lvl])
+
+    res = []
+    t = 0.0
+    for (w, lvl) in widths:
+        if jitter:
+            w = max(w * (1.0 + rng.gauss(0.0, jitter)), w / 100)
+        if noise:
+            l = lvl + rng.gauss(0.0, noise)
+            lvl = 1 if l > 0.5 else -1 if l < -0.5 else 0
+        t += w
+        res.append((t, lvl, w))
+    return tuple(res)
+
+def compare_blocks(expected, actual):
+    ''' Compare sequences of blocks `expected` and `actual` by their tape
+        bytes and return a list of `BlockDiff` for each block that differs.
+    '''
+    diffs = []
+    for i, (e, a) in enumerate(zip_longest(expected, actual)):
+        eb = None if e is None else bytes(e.to_bytes())
+        ab = None if a is None else bytes(a.to_bytes())
+        if eb != ab:
+            diffs.append(BlockDiff(i, eb, ab))
+    return diffs
+
+def verify(platform, blocks, jitter=0.0, noise=0.0, seed=None):
+    ''' Encode `blocks` for `platform` to pulses, decode them again and
+        return a list of `BlockDiff` for each block that did not survive
+        the round trip; an empty list means the blocks verified.
+
+        `jitter` and `noise` are as for `chunks_to_pulses()`; `seed` seeds
+        the random number generator for them so that runs are repeatable.
+        A `ReadError` (or, for malformed data, a platform-specific
+        exception) is raised if the pulses cannot be decoded at all.
+    '''
+    blocks = tuple(blocks)
+    bm = get_block_module(platform)
+    chunks = bm.FileEncoder().encode_file(blocks)
+    pulses = chunks_to_pulses(chunks, jitter, noise, random.Random(seed))
+    v2('verify: {} pulses', len(pulses))
+    (_, decoded) = bm.FileReader().read_file(pulses, 0)
+    diffs = compare_blocks(blocks, decoded)
+    v2('verify: {} blocks, {} decoded, {} differ',
+        len(blocks), len(decoded), len(diffs))
+    return diffs